@@ -0,0 +1,125 @@
+"""Keyset-paginated, filterable reads of the admin result/profile datasets.
+
+Every dataset is ordered by an indexed integer key; a page is "key > after
+LIMIT n", so deep pages cost the same as the first one, and the export
+generators walk the same query with fetchmany instead of loading all rows.
+"""
+import csv
+import io
+import json
+
+
+DATASETS = {
+    'results': {
+        'select': '''SELECT uo.user_id, uo.kelompok, uo.pretest, uo.posttest,
+                            (uo.posttest - uo.pretest) AS improvement,
+                            up.level_rekomendasi, uo.updated_at
+                     FROM user_outcomes uo
+                     LEFT JOIN user_profiles up ON up.user_id = uo.user_id''',
+        'where': ['uo.pretest IS NOT NULL', 'uo.posttest IS NOT NULL'],
+        'key': 'uo.user_id',
+        'key_name': 'user_id',
+        'columns': {'kelompok': 'uo.kelompok', 'level': 'up.level_rekomendasi', 'date': 'uo.updated_at'},
+    },
+    'profiles': {
+        'select': '''SELECT up.id, up.user_id, up.usia, up.jenis_kelamin, up.pendidikan, up.lokasi,
+                            up.pengalaman, up.skor_pretest, up.level_rekomendasi, u.kelompok, up.created_at
+                     FROM user_profiles up
+                     JOIN users u ON up.user_id = u.id''',
+        'where': ['up.usia IS NOT NULL'],
+        'key': 'up.id',
+        'key_name': 'id',
+        'columns': {'kelompok': 'u.kelompok', 'level': 'up.level_rekomendasi', 'date': 'up.created_at'},
+    },
+}
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 1000
+
+
+def parse_filters(args):
+    """Filters from request args: kelompok, level, since/until (YYYY-MM-DD, inclusive)"""
+    return {name: args.get(name) for name in ('kelompok', 'level', 'since', 'until') if args.get(name)}
+
+
+def build_query(dataset, filters, after=None, limit=None):
+    spec = DATASETS[dataset]
+    columns = spec['columns']
+    where = list(spec['where'])
+    params = []
+
+    if 'kelompok' in filters:
+        where.append(f"{columns['kelompok']} = ?")
+        params.append(filters['kelompok'])
+    if 'level' in filters:
+        where.append(f"{columns['level']} = ?")
+        params.append(filters['level'])
+    if 'since' in filters:
+        where.append(f"{columns['date']} >= date(?)")
+        params.append(filters['since'])
+    if 'until' in filters:
+        where.append(f"{columns['date']} < date(?, '+1 day')")
+        params.append(filters['until'])
+    if after is not None:
+        where.append(f"{spec['key']} > ?")
+        params.append(after)
+
+    sql = f"{spec['select']} WHERE {' AND '.join(where)} ORDER BY {spec['key']}"
+    if limit is not None:
+        sql += ' LIMIT ?'
+        params.append(limit)
+    return sql, params
+
+
+def fetch_page(conn, dataset, filters, after=None, limit=DEFAULT_PAGE_SIZE):
+    """(rows, next_after) - next_after is None on the last page"""
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    sql, params = build_query(dataset, filters, after, limit + 1)
+    rows = conn.execute(sql, params).fetchall()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, rows[-1][DATASETS[dataset]['key_name']]
+    return rows, None
+
+
+def iter_rows(conn, dataset, filters, chunk_size=1000):
+    """Yield every matching row, holding at most chunk_size rows in memory"""
+    sql, params = build_query(dataset, filters)
+    cursor = conn.execute(sql, params)
+    while True:
+        rows = cursor.fetchmany(chunk_size)
+        if not rows:
+            break
+        yield from rows
+
+
+def stream_csv(rows, flush_every=500):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for i, row in enumerate(rows):
+        if i == 0:
+            writer.writerow(row.keys())
+        writer.writerow(tuple(row))
+        if i % flush_every == flush_every - 1:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate(0)
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def stream_ndjson(rows, flush_every=500):
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(dict(row)) + '\n')
+        if len(lines) >= flush_every:
+            yield ''.join(lines)
+            lines = []
+    if lines:
+        yield ''.join(lines)
+
+
+EXPORT_FORMATS = {
+    'csv': ('text/csv', stream_csv),
+    'ndjson': ('application/x-ndjson', stream_ndjson),
+}
@@ -1,116 +1,185 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
+from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify, make_response, Response, stream_with_context
 import sqlite3
 import json
 from datetime import datetime
-import random
+import logging
+import math
 import os
 
+from werkzeug.middleware.proxy_fix import ProxyFix
+
+import admin_data
+import assets
+import assignment
+import content as content_module
+import credentials
+import db
+import instrumentation
+import log_config
+import migrations
+from exposure_log import ExposureLogger
+from model_registry import FallbackModel, ModelRegistry
+import rollups
+import sequential
+import sessions
+from prediction_cache import PredictionCache
+from shadow import ShadowScorer
+from training_jobs import TrainingJobRunner
+
+# JSON logs written by a background listener thread
+log_config.configure()
+logger = logging.getLogger(__name__)
+
 # Import model hanya jika file exists
 try:
-    from model import recommendation_model
+    from model import recommendation_model, RecommendationModel
     ML_AVAILABLE = True
-    print("✅ ML model loaded successfully")
+    logger.info("ML model loaded successfully")
 except ImportError as e:
-    print(f"⚠️ ML model not available: {e}. Using fallback recommendations.")
+    logger.warning("ML model not available: %s. Using fallback recommendations.", e)
     ML_AVAILABLE = False
-    # Create a simple fallback
-    class FallbackModel:
-        def predict_recommendation(self, user_data):
-            # Simple rule-based fallback
-            score = user_data.get('skor_pretest', 0)
-            if score < 40:
-                return 'Pemula'
-            elif score < 70:
-                return 'Menengah'
-            else:
-                return 'Lanjutan'
-        
-        def load_model(self):
-            return True
-            
-        def train_model(self):
-            return True
-    
+    # Simple rule-based fallback
     recommendation_model = FallbackModel()
 
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
 
+# Number of reverse proxies in front of the app; their X-Forwarded-* headers give
+# request.remote_addr the client's address (the login limiter keys on it)
+proxy_count = int(os.environ.get('PROXY_FIX_X_FOR', 0))
+if proxy_count:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxy_count, x_proto=proxy_count)
+
 # Database configuration
+app.config['DATABASE'] = os.environ.get('DATABASE_PATH', 'database.db')
+app.config['DB_POOL_SIZE'] = int(os.environ.get('DB_POOL_SIZE', 8))
+app.config['DB_CACHED_STATEMENTS'] = int(os.environ.get('DB_CACHED_STATEMENTS', 256))
+app.config['DB_POOL_TIMEOUT'] = float(os.environ.get('DB_POOL_TIMEOUT', 30))
+app.config['DB_STORAGE'] = db.StorageConfig.from_env()
+# Pooled connections time every statement for /metrics
+app.config['DB_CONNECTION_FACTORY'] = instrumentation.InstrumentedConnection
+
+db_pool = db.init_app(app)
+log_config.init_app(app)
+
+# Bring the schema up to date at setup, not only under __main__ (flask run, gunicorn and imports too)
+with app.app_context():
+    try:
+        migrations.migrate(db.get_connection(db_pool), storage=db_pool.storage)
+    except Exception:
+        logger.exception("Database migration error")
+
+# Session data lives server-side (SESSION_BACKEND); funnel state generations live in a separate store
+session_store, funnel_store = sessions.init_app(app, db_pool)
+funnel_states = sessions.FunnelStateCache(funnel_store, ttl=float(os.environ.get('FUNNEL_STATE_TTL', 3600)))
+
+# Password hashing on a bounded pool, and login/register flood limits checked before any hashing
+password_hasher = credentials.PasswordHasher.from_env()
+login_limiter = credentials.LoginLimiter.from_env()
+
+# Minified, fingerprinted and precompressed CSS under /assets/ (see assets.py)
+asset_manifest = assets.init_app(app)
+# Education pages link those bundles, so their validators change with each build
+asset_version = assets.version(asset_manifest)
+
+# Request/template timing; PROFILE_SLOW_REQUEST_MS enables the slow-request sampling profiler
+metrics_registry = instrumentation.init_app(app, profiler=instrumentation.SlowRequestProfiler.from_env())
+
+# Prediction cache for the experiment group's recommendations
+prediction_cache = PredictionCache(maxsize=int(os.environ.get('PREDICTION_CACHE_SIZE', 10000)),
+                                   ttl=float(os.environ.get('PREDICTION_CACHE_TTL', 3600)))
+
+# Education material (data/education_content.json) and its rendered page fragments
+content_library = content_module.ContentLibrary()
+fragment_cache = content_module.FragmentCache(app.jinja_env, content_library)
+
+# Group assignment experiment (hash-based, see EXPERIMENT_CONFIG)
+experiment = assignment.load_experiment()
+# All concurrently running experiments, keyed by name (kelompok first)
+experiments = assignment.load_experiments(experiment)
+
+
+@app.context_processor
+def inject_kelompok_label():
+    """kelompok_label(arm) for user-facing pages: held-out users see the baseline's label"""
+    return {'kelompok_label': experiment.label}
+
+# Exposure events are queued here and written in batches by a background thread
+exposure_logger = ExposureLogger(db_pool,
+                                 batch_size=int(os.environ.get('EXPOSURE_BATCH_SIZE', 500)),
+                                 flush_interval=float(os.environ.get('EXPOSURE_FLUSH_INTERVAL', 1.0)))
+
+# Sequential monitoring settings (mSPRT over Welford moments updated per posttest)
+sequential_config = sequential.SequentialConfig.from_env(baseline=experiment.baseline)
+
+# A/B statistics, recomputed only when new test results arrive
+try:
+    import experiment_stats
+    stats_cache = experiment_stats.StatsCache(n_resamples=int(os.environ.get('BOOTSTRAP_RESAMPLES', 10000)),
+                                               baseline=experiment.baseline)
+except ImportError as e:
+    logger.warning("Statistics module not available: %s", e)
+    stats_cache = None
+
+# Candidate models scored off the request path against live /education traffic
+shadow_scorer = ShadowScorer(max_workers=int(os.environ.get('SHADOW_WORKERS', 2)),
+                             max_pending=int(os.environ.get('SHADOW_MAX_PENDING', 32)))
+
+# Background model training, swapped in only after validation
+training_runner = None
+if ML_AVAILABLE:
+    training_runner = TrainingJobRunner(recommendation_model, RecommendationModel,
+                                        min_accuracy=float(os.environ.get('MODEL_MIN_ACCURACY', 0.5)),
+                                        shadow_scorer=shadow_scorer,
+                                        min_rows=int(os.environ.get('MODEL_MIN_TRAINING_ROWS', 50)))
+
+# Recommender variants for the personalized arm (MODEL_VARIANTS), routed by username hash
+model_registry = ModelRegistry.from_env(recommendation_model, ML_AVAILABLE)
+# Loaded here so every server (flask run, gunicorn) has them; missing ones train off the request path
+try:
+    missing_variants = model_registry.ensure_loaded(train=False)
+    if missing_variants:
+        model_registry.train_in_background(missing_variants)
+except Exception:
+    logger.exception("Model variant loading error")
+
+# Scrape-time gauges for the in-process pools, caches and queues
+metrics_registry.gauge('db_pool_connections', 'Open and idle pooled connections',
+                       lambda: {('open',): db_pool.metrics()['open'], ('idle',): db_pool.metrics()['idle']},
+                       ('state',))
+metrics_registry.gauge('prediction_cache_hit_rate', 'Prediction cache hit rate',
+                       lambda: prediction_cache.stats()['hit_rate'])
+metrics_registry.gauge('exposure_log_queued', 'Exposure events waiting to be flushed',
+                       lambda: exposure_logger.stats()['queued'])
+metrics_registry.gauge('shadow_dropped', 'Shadow predictions dropped because the pool was saturated',
+                       lambda: (shadow_scorer.stats()['candidate'] or {}).get('dropped', 0))
+
 def get_db_connection():
-    """Get database connection - supports both SQLite and PostgreSQL"""
+    """Get pooled database connection - returned to the pool on app context teardown"""
     try:
-        # Default to SQLite
-        conn = sqlite3.connect('database.db')
-        conn.row_factory = sqlite3.Row
-        return conn
-    except Exception as e:
-        print(f"Database connection error: {e}")
+        return db.get_connection(db_pool)
+    except Exception:
+        logger.exception("Database connection error")
         return None
 
+def execute_write(conn, statements):
+    """Run (sql, params) statements as one write transaction, retrying when the database is busy"""
+    db.execute_write(conn, statements, db_pool.storage)
+
 # Initialize database
 def init_db():
-    """Initialize database tables"""
+    """Bring the database schema up to date via versioned migrations"""
     try:
         conn = get_db_connection()
         if conn is None:
-            print("❌ Cannot initialize database - no connection")
+            logger.error("Cannot initialize database - no connection")
             return
             
-        c = conn.cursor()
+        migrations.migrate(conn, storage=db_pool.storage)
+        logger.info("Database schema at version %s", migrations.current_version(conn))
         
-        # Users table
-        c.execute('''CREATE TABLE IF NOT EXISTS users
-                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                      username TEXT UNIQUE NOT NULL,
-                      password TEXT NOT NULL,
-                      email TEXT,
-                      kelompok TEXT DEFAULT 'control',
-                      created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
-        
-        # Pre-test results
-        c.execute('''CREATE TABLE IF NOT EXISTS pretest_results
-                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                      user_id INTEGER NOT NULL,
-                      answers TEXT NOT NULL,
-                      score INTEGER NOT NULL,
-                      created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                      FOREIGN KEY (user_id) REFERENCES users (id))''')
-        
-        # Post-test results
-        c.execute('''CREATE TABLE IF NOT EXISTS posttest_results
-                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                      user_id INTEGER NOT NULL,
-                      answers TEXT NOT NULL,
-                      score INTEGER NOT NULL,
-                      created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                      FOREIGN KEY (user_id) REFERENCES users (id))''')
-        
-        # User profiles for ML
-        c.execute('''CREATE TABLE IF NOT EXISTS user_profiles
-                     (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                      user_id INTEGER NOT NULL,
-                      usia INTEGER,
-                      jenis_kelamin TEXT,
-                      pendidikan TEXT,
-                      pengalaman INTEGER,
-                      minat_1 INTEGER,
-                      minat_2 INTEGER,
-                      minat_3 INTEGER,
-                      minat_4 INTEGER,
-                      minat_5 INTEGER,
-                      lokasi TEXT,
-                      skor_pretest INTEGER,
-                      level_rekomendasi TEXT,
-                      created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                      FOREIGN KEY (user_id) REFERENCES users (id))''')
-        
-        conn.commit()
-        conn.close()
-        print("✅ Database tables initialized successfully")
-        
-    except Exception as e:
-        print(f"❌ Database initialization error: {e}")
+    except Exception:
+        logger.exception("Database initialization error")
 
 @app.route('/')
 def index():
@@ -124,6 +193,21 @@ def home():
     """Home page"""
     return render_template('home.html')
 
+def load_funnel_state(user_id):
+    """Profile/pretest/posttest progress of a user, in one query"""
+    conn = get_db_connection()
+    if conn is None:
+        raise RuntimeError('Database error')
+    row = conn.execute('''SELECT EXISTS(SELECT 1 FROM user_profiles WHERE user_id = :user_id) AS profile_complete,
+                          (SELECT score FROM pretest_results WHERE user_id = :user_id
+                           ORDER BY created_at DESC LIMIT 1) AS pretest_score,
+                          (SELECT score FROM posttest_results WHERE user_id = :user_id
+                           ORDER BY created_at DESC LIMIT 1) AS posttest_score''',
+                       {'user_id': user_id}).fetchone()
+    return {'profile_complete': bool(row['profile_complete']),
+            'pretest_score': row['pretest_score'],
+            'posttest_score': row['posttest_score']}
+
 @app.route('/dashboard')
 def dashboard():
     """User dashboard"""
@@ -132,42 +216,36 @@ def dashboard():
         return redirect(url_for('login'))
     
     try:
-        conn = get_db_connection()
-        if conn is None:
-            flash('Database error', 'error')
-            return render_template('dashboard.html', 
-                                 username=session.get('username'), 
-                                 kelompok=session.get('kelompok', 'control'),
-                                 profile_complete=False,
-                                 pretest_complete=False)
-        
-        profile = conn.execute('SELECT * FROM user_profiles WHERE user_id = ?', 
-                              (session['user_id'],)).fetchone()
-        pretest = conn.execute('SELECT * FROM pretest_results WHERE user_id = ? ORDER BY created_at DESC LIMIT 1', 
-                              (session['user_id'],)).fetchone()
-        conn.close()
-        
-        profile_complete = profile is not None
-        pretest_complete = pretest is not None
-        
-        # Update session flags
-        session['profile_complete'] = profile_complete
-        session['pretest_score'] = pretest['score'] if pretest else None
+        # The session carries the flags until a profile/pretest/posttest write changes the
+        # user's generation, so steady-state views skip the funnel queries
+        funnel_states.sync(session, load_funnel_state)
+        profile_complete = session.get('profile_complete', False)
+        pretest_complete = session.get('pretest_score') is not None
         
         return render_template('dashboard.html', 
                              username=session['username'], 
                              kelompok=session['kelompok'],
+                             experiment=experiment,
                              profile_complete=profile_complete,
                              pretest_complete=pretest_complete)
                              
-    except Exception as e:
-        print(f"Dashboard error: {e}")
+    except Exception:
+        logger.exception("Dashboard error")
         return render_template('dashboard.html', 
                              username=session.get('username'), 
-                             kelompok=session.get('kelompok', 'control'),
+                             kelompok=session.get('kelompok', experiment.baseline),
+                             experiment=experiment,
                              profile_complete=False,
                              pretest_complete=False)
 
+def rate_limited(template_name, retry_after):
+    """429 page for a login/register attempt over the limit"""
+    wait = max(1, math.ceil(retry_after))
+    flash(f'Terlalu banyak percobaan. Silakan coba lagi dalam {wait} detik.', 'error')
+    response = make_response(render_template(template_name), 429)
+    response.headers['Retry-After'] = str(wait)
+    return response
+
 @app.route('/login', methods=['GET', 'POST'])
 def login():
     """User login"""
@@ -179,17 +257,30 @@ def login():
             flash('Username dan password harus diisi', 'error')
             return render_template('login.html')
         
+        retry_after = login_limiter.check(request.remote_addr, username)
+        if retry_after:
+            return rate_limited('login.html', retry_after)
+        
         try:
             conn = get_db_connection()
             if conn is None:
                 flash('Database error', 'error')
                 return render_template('login.html')
                 
-            user = conn.execute('SELECT * FROM users WHERE username = ? AND password = ?', 
-                               (username, password)).fetchone()
-            conn.close()
+            user = conn.execute('SELECT * FROM users WHERE username = ?', (username,)).fetchone()
             
-            if user:
+            # Unknown usernames still pay for one hash, so they can't be told apart by timing
+            if password_hasher.verify(user['password'] if user else None, password):
+                # Plaintext rows (and hashes with an older PASSWORD_HASH_METHOD) are upgraded on login
+                if password_hasher.needs_rehash(user['password']):
+                    execute_write(conn, [
+                        ('UPDATE users SET password = ? WHERE id = ?', (password_hasher.hash(password), user['id'])),
+                    ])
+                    password_hasher.record_rehash()
+                
+                # New session id on login (no-op for the cookie backend)
+                if hasattr(session, 'rotate'):
+                    session.rotate()
                 session['user_id'] = user['id']
                 session['username'] = user['username']
                 session['kelompok'] = user['kelompok']
@@ -198,8 +289,12 @@ def login():
             else:
                 flash('Username atau password salah!', 'error')
                 
-        except Exception as e:
-            print(f"Login error: {e}")
+        except credentials.HasherBusy:
+            logger.warning("Login rejected: password hashing pool saturated")
+            flash('Server sedang sibuk, silakan coba lagi', 'error')
+            return render_template('login.html'), 503
+        except Exception:
+            logger.exception("Login error")
             flash('Terjadi error saat login', 'error')
     
     return render_template('login.html')
@@ -216,27 +311,40 @@ def register():
             flash('Username dan password harus diisi', 'error')
             return render_template('register.html')
         
-        # Randomly assign to experimental or control group
-        kelompok = 'experiment' if random.random() > 0.5 else 'control'
+        retry_after = login_limiter.check(request.remote_addr)
+        if retry_after:
+            return rate_limited('register.html', retry_after)
+        
+        # Deterministic assignment from the username, no DB lookup needed
+        kelompok = experiment.assign(username)
         
         try:
             conn = get_db_connection()
             if conn is None:
                 flash('Database error', 'error')
                 return render_template('register.html')
+            
+            # Taken usernames are rejected before paying for the hash (the UNIQUE constraint still guards races)
+            if conn.execute('SELECT 1 FROM users WHERE username = ?', (username,)).fetchone():
+                flash('Username sudah digunakan!', 'error')
+                return render_template('register.html')
                 
-            conn.execute('INSERT INTO users (username, password, email, kelompok) VALUES (?, ?, ?, ?)',
-                        (username, password, email, kelompok))
-            conn.commit()
-            conn.close()
+            execute_write(conn, [
+                ('INSERT INTO users (username, password, email, kelompok) VALUES (?, ?, ?, ?)',
+                 (username, password_hasher.hash(password), email, kelompok)),
+            ])
             
             flash('Registrasi berhasil! Silakan login.', 'success')
             return redirect(url_for('login'))
             
         except sqlite3.IntegrityError:
             flash('Username sudah digunakan!', 'error')
+        except credentials.HasherBusy:
+            logger.warning("Registration rejected: password hashing pool saturated")
+            flash('Server sedang sibuk, silakan coba lagi', 'error')
+            return render_template('register.html'), 503
         except Exception as e:
-            print(f"Registration error: {e}")
+            logger.exception("Registration error")
             flash(f'Error: {str(e)}', 'error')
     
     return render_template('register.html')
@@ -283,39 +391,29 @@ def profile():
                 flash('Database error', 'error')
                 return redirect(url_for('profile'))
             
-            # Check if profile exists
-            existing_profile = conn.execute(
-                'SELECT * FROM user_profiles WHERE user_id = ?', 
-                (session['user_id'],)
-            ).fetchone()
-            
-            if existing_profile:
-                # Update existing profile
-                conn.execute('''UPDATE user_profiles 
-                             SET usia=?, jenis_kelamin=?, pendidikan=?, lokasi=?, pengalaman=?,
-                             minat_1=?, minat_2=?, minat_3=?, minat_4=?, minat_5=?
-                             WHERE user_id=?''',
-                            (usia, jenis_kelamin, pendidikan, lokasi, pengalaman,
-                             minat_1, minat_2, minat_3, minat_4, minat_5,
-                             session['user_id']))
-            else:
-                # Insert new profile
-                conn.execute('''INSERT INTO user_profiles 
-                             (user_id, usia, jenis_kelamin, pendidikan, lokasi, pengalaman,
-                             minat_1, minat_2, minat_3, minat_4, minat_5)
-                             VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                            (session['user_id'], usia, jenis_kelamin, pendidikan, lokasi, pengalaman,
-                             minat_1, minat_2, minat_3, minat_4, minat_5))
-            
-            conn.commit()
-            conn.close()
+            # Insert or update in one statement (user_profiles.user_id is UNIQUE)
+            execute_write(conn, [
+                ('''INSERT INTO user_profiles 
+                   (user_id, usia, jenis_kelamin, pendidikan, lokasi, pengalaman,
+                   minat_1, minat_2, minat_3, minat_4, minat_5)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT(user_id) DO UPDATE SET
+                   usia=excluded.usia, jenis_kelamin=excluded.jenis_kelamin,
+                   pendidikan=excluded.pendidikan, lokasi=excluded.lokasi,
+                   pengalaman=excluded.pengalaman, minat_1=excluded.minat_1,
+                   minat_2=excluded.minat_2, minat_3=excluded.minat_3,
+                   minat_4=excluded.minat_4, minat_5=excluded.minat_5''',
+                 (session['user_id'], usia, jenis_kelamin, pendidikan, lokasi, pengalaman,
+                  minat_1, minat_2, minat_3, minat_4, minat_5)),
+            ])
             
+            funnel_states.invalidate(session['user_id'])
             session['profile_complete'] = True
             flash('Profil berhasil disimpan!', 'success')
             return redirect(url_for('dashboard'))
             
         except Exception as e:
-            print(f"Profile save error: {e}")
+            logger.exception("Profile save error")
             flash(f'Error menyimpan profil: {str(e)}', 'error')
     
     # GET request - show profile form
@@ -325,12 +423,11 @@ def profile():
         if conn:
             profile_data = conn.execute('SELECT * FROM user_profiles WHERE user_id = ?', 
                                   (session['user_id'],)).fetchone()
-            conn.close()
         
         return render_template('profile.html', profile=profile_data)
         
-    except Exception as e:
-        print(f"Profile load error: {e}")
+    except Exception:
+        logger.exception("Profile load error")
         return render_template('profile.html', profile=None)
 
 @app.route('/pretest', methods=['GET', 'POST'])
@@ -361,22 +458,21 @@ def pretest():
                 flash('Database error', 'error')
                 return redirect(url_for('pretest'))
                 
-            conn.execute('INSERT INTO pretest_results (user_id, answers, score) VALUES (?, ?, ?)',
-                        (session['user_id'], json.dumps(answers), score))
-            
-            # Update user profile with pretest score
-            conn.execute('UPDATE user_profiles SET skor_pretest = ? WHERE user_id = ?',
-                        (score, session['user_id']))
-            
-            conn.commit()
-            conn.close()
+            execute_write(conn, [
+                ('INSERT INTO pretest_results (user_id, answers, score) VALUES (?, ?, ?)',
+                 (session['user_id'], json.dumps(answers), score)),
+                # Update user profile with pretest score
+                ('UPDATE user_profiles SET skor_pretest = ? WHERE user_id = ?',
+                 (score, session['user_id'])),
+            ])
             
+            funnel_states.invalidate(session['user_id'])
             session['pretest_score'] = score
             flash(f'Pre-test completed! Score: {score}', 'success')
             return redirect(url_for('dashboard'))
             
-        except Exception as e:
-            print(f"Pretest error: {e}")
+        except Exception:
+            logger.exception("Pretest error")
             flash('Error menyimpan hasil pre-test', 'error')
     
     return render_template('pretest.html')
@@ -405,20 +501,22 @@ def education():
                                 WHERE up.user_id = ? 
                                 ORDER BY pr.created_at DESC LIMIT 1''', 
                               (session['user_id'],)).fetchone()
-        conn.close()
         
         if not profile:
             flash('Silakan lengkapi profil terlebih dahulu', 'error')
             return redirect(url_for('profile'))
         
         # Mark that user has accessed education
-        session['education_accessed'] = True
+        # (only once, so repeat views don't re-issue the session cookie)
+        if not session.get('education_accessed'):
+            session['education_accessed'] = True
         
         # Convert to dictionary for easier access
         profile_dict = dict(profile) if profile else {}
         
         # Determine content based on group and ML availability
-        if session['kelompok'] == 'experiment' and ML_AVAILABLE:
+        model_variant = assigned_variant = None
+        if experiment.is_personalized(session['kelompok']) and ML_AVAILABLE:
             # Use ML model for experimental group
             user_data = {
                 'usia': profile_dict.get('usia', 25),
@@ -434,92 +532,63 @@ def education():
                 'lokasi': profile_dict.get('lokasi', 'Jakarta')
             }
             
-            # Get ML recommendation
+            # Get ML recommendation from this user's model variant
             try:
-                recommendation = recommendation_model.predict_recommendation(user_data)
+                assigned_variant = model_registry.route(session['username'])
+                # Served by the default model until the assigned variant is loaded
+                model_variant = model_registry.serving(assigned_variant)
+                recommendation, confidence = model_registry.predict(model_variant, user_data, prediction_cache)
+                
+                # Shadow the candidate only against the model it would replace
+                if model_registry.models[model_variant] is recommendation_model:
+                    shadow_scorer.submit(user_data, recommendation, confidence)
                 
-                # Save recommendation to database
-                conn = get_db_connection()
-                if conn:
-                    conn.execute('UPDATE user_profiles SET level_rekomendasi = ? WHERE user_id = ?',
-                                (recommendation, session['user_id']))
-                    conn.commit()
-                    conn.close()
+                # Save recommendation to database only when it changed, and never the
+                # confidence-0.0 placeholder returned when the model is unavailable
+                if confidence and recommendation != profile_dict.get('level_rekomendasi'):
+                    execute_write(conn, [
+                        ('UPDATE user_profiles SET level_rekomendasi = ? WHERE user_id = ?',
+                         (recommendation, session['user_id'])),
+                    ])
                 
-                content = get_personalized_content(recommendation)
+                content = content_library.personalized(recommendation)
+                level = content['level']
                 template_name = 'education_experiment.html'
                 
-            except Exception as e:
-                print(f"ML prediction failed: {e}")
+            except Exception:
+                logger.exception("ML prediction failed")
                 # Fallback to static content
-                content = get_static_content()
+                level = None
+                content = content_library.static()
                 template_name = 'education_control.html'
                 
         else:
             # Static content for control group or ML failure
-            content = get_static_content()
+            level = None
+            content = content_library.static()
             template_name = 'education_control.html'
         
-        return render_template(template_name, content=content, kelompok=session['kelompok'])
-        
-    except Exception as e:
-        print(f"Education error: {e}")
+        # Record exposure to every running experiment (queued, flushed off the request path)
+        exposures = assignment.assign_all(experiments, session['username'], {experiment.name: session['kelompok']})
+        # Only users served by their assigned variant count towards its comparison
+        if model_variant is not None and model_variant == assigned_variant:
+            exposures[model_registry.experiment.name] = model_variant
+        exposure_logger.log(session['user_id'], exposures, 'education')
+        
+        # The content block depends only on (template, level, kelompok); base.html adds the per-user parts
+        fragment = fragment_cache.get(template_name, level, session['kelompok'], content)
+        return content_module.conditional_response(
+            fragment, f"{session['username']}:{session['kelompok']}:{asset_version}",
+            lambda: render_template('education_page.html', fragment=fragment.html),
+            # Pending flash messages are part of the page, so it must be rendered
+            allow_not_modified='_flashes' not in session,
+            last_modified=app.extensions.get('assets_built_at'))
+        
+    except Exception:
+        logger.exception("Education error")
         flash('Error mengakses materi edukasi', 'error')
         return redirect(url_for('dashboard'))
 
-def get_personalized_content(recommendation):
-    """Get personalized content based on ML recommendation"""
-    content_map = {
-        'Pemula': {
-            'title': 'Materi Level Pemula - Personalisasi',
-            'level': 'Pemula',
-            'content': [
-                'Konsep dasar rehabilitasi medis dan pentingnya konsistensi dalam proses pemulihan.',
-                'Teknik pernapasan dan relaksasi untuk mengurangi ketegangan otot dan meningkatkan sirkulasi darah.',
-                'Latihan dasar penguatan otot dengan panduan visual yang mudah diikuti.',
-                'Pentingnya nutrisi seimbang dan hidrasi yang cukup selama proses rehabilitasi.',
-                'Strategi mengatasi hambatan mental dan membangun motivasi untuk konsistensi latihan.'
-            ]
-        },
-        'Menengah': {
-            'title': 'Materi Level Menengah - Personalisasi',
-            'level': 'Menengah',
-            'content': [
-                'Teknik rehabilitasi tingkat menengah dengan fokus pada koordinasi dan keseimbangan.',
-                'Latihan fungsional untuk aktivitas sehari-hari dengan intensitas yang disesuaikan.',
-                'Manajemen nyeri dan strategi mengatasi ketidaknyamanan selama rehabilitasi.',
-                'Peningkatan daya tahan tubuh melalui latihan progresif yang terukur.',
-                'Integrasi teknologi dan alat bantu dalam proses rehabilitasi modern.'
-            ]
-        },
-        'Lanjutan': {
-            'title': 'Materi Level Lanjutan - Personalisasi',
-            'level': 'Lanjutan',
-            'content': [
-                'Teknik rehabilitasi kompleks untuk kondisi spesifik dengan pendekatan multidisiplin.',
-                'Program latihan intensif dengan monitoring perkembangan real-time.',
-                'Strategi pemeliharaan hasil rehabilitasi dan pencegangan regresi.',
-                'Integrasi mindfulness dan teknik mental dalam proses pemulihan fisik.',
-                'Pengembangan rencana jangka panjang untuk kesehatan dan kebugaran berkelanjutan.'
-            ]
-        }
-    }
-    
-    return content_map.get(recommendation, content_map['Pemula'])
-
-def get_static_content():
-    """Get static content for control group"""
-    return {
-        'title': 'Materi Edukasi Rehabilitasi Standar',
-        'content': [
-            'Pengenalan umum tentang rehabilitasi medis dan manfaatnya bagi pemulihan kesehatan.',
-            'Prinsip dasar latihan fisik yang aman dan efektif untuk berbagai kondisi.',
-            'Pentingnya konsistensi dan disiplin dalam menjalani program rehabilitasi.',
-            'Tips mengatur jadwal latihan yang seimbang dengan aktivitas sehari-hari.',
-            'Pemahaman tentang tanda-tanda kemajuan dan kapan harus berkonsultasi dengan profesional.'
-        ]
-    }
-
 @app.route('/posttest', methods=['GET', 'POST'])
 def posttest():
     """Post-test assessment"""
@@ -550,17 +619,29 @@ def posttest():
                 flash('Database error', 'error')
                 return redirect(url_for('posttest'))
                 
-            conn.execute('INSERT INTO posttest_results (user_id, answers, score) VALUES (?, ?, ?)',
-                        (session['user_id'], json.dumps(answers), score))
-            conn.commit()
-            conn.close()
+            def save_posttest(conn):
+                first_attempt = conn.execute('SELECT 1 FROM posttest_results WHERE user_id = ? LIMIT 1',
+                                             (session['user_id'],)).fetchone() is None
+                conn.execute('INSERT INTO posttest_results (user_id, answers, score) VALUES (?, ?, ?)',
+                            (session['user_id'], json.dumps(answers), score))
+                
+                # Only a user's first posttest feeds the sequential test
+                if first_attempt:
+                    outcome = conn.execute('SELECT kelompok, pretest FROM user_outcomes WHERE user_id = ?',
+                                           (session['user_id'],)).fetchone()
+                    if outcome and outcome['pretest'] is not None:
+                        sequential.record_observation(conn, outcome['kelompok'], score - outcome['pretest'],
+                                                      sequential_config)
+            
+            db.run_write(conn, save_posttest, db_pool.storage)
             
+            funnel_states.invalidate(session['user_id'])
             session['posttest_score'] = score
             flash(f'Post-test completed! Score: {score}', 'success')
             return redirect(url_for('results'))
             
-        except Exception as e:
-            print(f"Posttest error: {e}")
+        except Exception:
+            logger.exception("Posttest error")
             flash('Error menyimpan hasil post-test', 'error')
     
     return render_template('posttest.html')
@@ -598,67 +679,167 @@ def admin_analysis():
                                  profiles=[],
                                  admin=True)
         
-        # Get all results for analysis
-        results = conn.execute('''SELECT u.kelompok, pr.score as pretest, ptr.score as posttest,
-                                 (ptr.score - pr.score) as improvement
-                              FROM users u
-                              JOIN pretest_results pr ON u.id = pr.user_id
-                              JOIN posttest_results ptr ON u.id = ptr.user_id''').fetchall()
-        
-        # Get user profiles data for ML analysis
-        profiles = conn.execute('''SELECT up.*, u.kelompok 
-                                FROM user_profiles up
-                                JOIN users u ON up.user_id = u.id
-                                WHERE up.usia IS NOT NULL''').fetchall()
-        
-        conn.close()
-        
-        # Calculate statistics
-        experiment_scores = [r['improvement'] for r in results if r['kelompok'] == 'experiment']
-        control_scores = [r['improvement'] for r in results if r['kelompok'] == 'control']
+        # First page of each table; further pages via ?results_after= / ?profiles_after=
+        results_after = request.args.get('results_after', type=int)
+        profiles_after = request.args.get('profiles_after', type=int)
+        results, results_next = admin_data.fetch_page(conn, 'results', {}, after=results_after)
+        profiles, profiles_next = admin_data.fetch_page(conn, 'profiles', {}, after=profiles_after)
+        total_users = conn.execute('SELECT COUNT(*) FROM user_profiles WHERE usia IS NOT NULL').fetchone()[0]
+        
+        # Statistics come from the incrementally maintained rollups
+        group_rollups = rollups.load_rollups(conn)
+        arm_names = list(experiment.arms) + sorted(k for k in group_rollups if k not in experiment.arms)
+        arms = []
+        for name in arm_names:
+            improvement = rollups.metric(group_rollups, name, 'improvement')
+            arms.append({'name': name, 'label': experiment.label(name, reveal_holdout=True),
+                         'count': improvement.n, 'avg_improvement': improvement.mean})
+        
+        # Candidates awaiting promotion (POST form per job)
+        shadow_jobs = [job for job in training_runner.list() if job.status == 'shadowing'] if training_runner else []
         
         stats = {
-            'experiment_count': len(experiment_scores),
-            'control_count': len(control_scores),
-            'experiment_avg_improvement': sum(experiment_scores) / len(experiment_scores) if experiment_scores else 0,
-            'control_avg_improvement': sum(control_scores) / len(control_scores) if control_scores else 0,
-            'total_users': len(profiles)
+            'arms': arms,
+            'total_users': total_users
         }
         
-        return render_template('admin_analysis.html', results=results, stats=stats, profiles=profiles, admin=True)
+        return render_template('admin_analysis.html', results=results, stats=stats, profiles=profiles,
+                               results_after=results_after, profiles_after=profiles_after,
+                               shadow_jobs=shadow_jobs,
+                               results_next=results_next, profiles_next=profiles_next, admin=True)
         
-    except Exception as e:
-        print(f"Admin analysis error: {e}")
+    except Exception:
+        logger.exception("Admin analysis error")
         return render_template('admin_analysis.html', 
                              results=[], 
                              stats={}, 
                              profiles=[],
                              admin=True)
 
+@app.route('/admin/api/<dataset>')
+def admin_api_dataset(dataset):
+    """Keyset-paginated JSON for the results/profiles tables"""
+    if dataset not in admin_data.DATASETS:
+        return jsonify({'error': 'unknown dataset'}), 404
+    
+    conn = get_db_connection()
+    if conn is None:
+        return jsonify({'error': 'database error'}), 503
+    
+    rows, next_after = admin_data.fetch_page(conn, dataset, admin_data.parse_filters(request.args),
+                                             after=request.args.get('after', type=int),
+                                             limit=request.args.get('limit', admin_data.DEFAULT_PAGE_SIZE, type=int))
+    return jsonify({'items': [dict(row) for row in rows], 'next_after': next_after})
+
+@app.route('/admin/api/stats')
+def admin_api_stats():
+    """Welch t-test, effect size and bootstrap CIs per arm and segment"""
+    if stats_cache is None:
+        return jsonify({'error': 'statistics module not available'}), 503
+    
+    conn = get_db_connection()
+    if conn is None:
+        return jsonify({'error': 'database error'}), 503
+    
+    return jsonify(stats_cache.get(conn))
+
+@app.route('/admin/api/sequential')
+def admin_api_sequential():
+    """Always-valid p-values and stopping recommendation for the running experiment"""
+    conn = get_db_connection()
+    if conn is None:
+        return jsonify({'error': 'database error'}), 503
+    
+    return jsonify(sequential.report(conn, sequential_config))
+
+@app.route('/admin/api/exposures')
+def admin_api_exposures():
+    """Exposed users and exposure events per experiment arm"""
+    conn = get_db_connection()
+    if conn is None:
+        return jsonify({'error': 'database error'}), 503
+
+    rows = conn.execute('''SELECT experiment, arm, COUNT(DISTINCT user_id) AS users, COUNT(*) AS exposures,
+                                  MIN(exposed_at) AS first_exposed_at, MAX(exposed_at) AS last_exposed_at
+                           FROM experiment_exposures
+                           GROUP BY experiment, arm''').fetchall()
+    report = {name: {'config': exp.to_dict(), 'arms': {}} for name, exp in experiments.items()}
+    for row in rows:
+        entry = report.setdefault(row['experiment'], {'config': None, 'arms': {}})
+        entry['arms'][row['arm']] = {key: row[key] for key in ('users', 'exposures', 'first_exposed_at', 'last_exposed_at')}
+    return jsonify(report)
+
+@app.route('/admin/api/model_variants')
+def admin_api_model_variants():
+    """Per-variant accuracy, inference latency and learner outcomes"""
+    return jsonify(model_registry.report(get_db_connection()))
+
+@app.route('/admin/export/<dataset>.<fmt>')
+def admin_export_dataset(dataset, fmt):
+    """Stream a full dataset as CSV or NDJSON without loading it into memory"""
+    if dataset not in admin_data.DATASETS or fmt not in admin_data.EXPORT_FORMATS:
+        return jsonify({'error': 'unknown dataset or format'}), 404
+    
+    filters = admin_data.parse_filters(request.args)
+    mimetype, serializer = admin_data.EXPORT_FORMATS[fmt]
+    
+    def generate():
+        conn = get_db_connection()
+        yield from serializer(admin_data.iter_rows(conn, dataset, filters))
+    
+    return Response(stream_with_context(generate()), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename={dataset}.{fmt}'})
+
 @app.route('/admin/train_model')
 def admin_train_model():
-    """Manual ML model training"""
+    """Start ML model training in the background"""
     try:
         if not ML_AVAILABLE:
             flash('ML module not available', 'error')
             return redirect(url_for('admin_analysis'))
             
-        success = recommendation_model.train_model()
-        
-        if success:
-            flash('Model ML berhasil dilatih!', 'success')
-        else:
-            flash('Gagal melatih model ML', 'error')
+        # ?shadow=1 trains a candidate that is shadow-scored until promoted
+        job = training_runner.submit(shadow=request.args.get('shadow') == '1')
+        flash(f'Pelatihan model ML dimulai (job {job.id})', 'success')
         
     except Exception as e:
         flash(f'Error training model: {str(e)}', 'error')
     
     return redirect(url_for('admin_analysis'))
 
+@app.route('/admin/train_model/<job_id>')
+def admin_train_model_status(job_id):
+    """Status of a background training job"""
+    job = training_runner.get(job_id) if training_runner else None
+    if job is None:
+        return jsonify({'error': 'job not found'}), 404
+    return jsonify(job.to_dict())
+
+@app.route('/admin/shadow')
+def admin_shadow():
+    """Agreement of the shadow candidate with the serving model"""
+    return jsonify(shadow_scorer.stats())
+
+@app.route('/admin/shadow/promote/<job_id>', methods=['POST'])
+def admin_shadow_promote(job_id):
+    """Promote a shadowing candidate to the serving model"""
+    if training_runner is None:
+        flash('ML module not available', 'error')
+        return redirect(url_for('admin_analysis'))
+    
+    error = training_runner.promote(job_id)
+    if error:
+        flash(f'Promosi model gagal: {error}', 'error')
+    else:
+        flash(f'Model dari job {job_id} dipromosikan', 'success')
+    return redirect(url_for('admin_analysis'))
+
 @app.route('/logout')
 def logout():
     """User logout"""
     session.clear()
+    if hasattr(session, 'rotate'):
+        session.rotate()
     flash('Anda telah logout.', 'info')
     return redirect(url_for('login'))
 
@@ -671,6 +852,27 @@ def health_check():
         'service': 'flask-ab-testing'
     })
 
+@app.route('/metrics')
+def metrics():
+    """Prometheus text exposition of request, DB, inference and template metrics"""
+    return Response(metrics_registry.render(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/admin/stats')
+def admin_stats():
+    """Runtime metrics for the connection pool, caches, exposure log and shadow scorer"""
+    return jsonify({
+        'db_pool': db_pool.metrics(),
+        'prediction_cache': prediction_cache.stats(),
+        'exposure_log': exposure_logger.stats(),
+        'shadow': shadow_scorer.stats(),
+        'education_fragments': fragment_cache.stats(),
+        'sessions': session_store.stats() if session_store is not None else {'backend': 'cookie'},
+        'funnel_states': funnel_states.stats(),
+        'passwords': password_hasher.stats(),
+        'login_limiter': login_limiter.stats(),
+        'logging': log_config.stats()
+    })
+
 # Error handlers
 @app.errorhandler(404)
 def not_found_error(error):
@@ -683,24 +885,24 @@ def internal_error(error):
 # Production setup
 if __name__ == '__main__':
     # Initialize database
-    init_db()
+    with app.app_context():
+        init_db()
     
-    # Train model on startup if available
+    # Train model on startup if available (variants missing at setup are already training)
     if ML_AVAILABLE:
         try:
-            if not recommendation_model.load_model():
-                print("Training recommendation model...")
+            model_registry.wait_for_training()
+            if recommendation_model.predictor is None and not recommendation_model.load_model():
+                logger.info("Training recommendation model...")
                 recommendation_model.train_model()
-        except Exception as e:
-            print(f"Model training error: {e}")
+        except Exception:
+            logger.exception("Model training error")
     
     # Production vs Development
     debug_mode = os.environ.get('FLASK_DEBUG', 'False').lower() == 'true'
     port = int(os.environ.get('PORT', 5000))
     
-    print(f"🚀 Starting Flask A/B Testing App...")
-    print(f"📊 ML Available: {ML_AVAILABLE}")
-    print(f"🔧 Debug Mode: {debug_mode}")
-    print(f"🌐 Port: {port}")
+    logger.info("Starting Flask A/B Testing App",
+                extra={'data': {'ml_available': ML_AVAILABLE, 'debug': debug_mode, 'port': port}})
     
     app.run(host='0.0.0.0', port=port, debug=debug_mode)
\ No newline at end of file
@@ -0,0 +1,207 @@
+"""Static asset pipeline: minified, fingerprinted and precompressed CSS.
+
+`python assets.py` concatenates and minifies each bundle in BUNDLES, writes it
+to ASSET_DIR (default static/dist) as <name>.<content hash>.<ext> together
+with .gz (and .br when the brotli package is installed) variants, and records
+the mapping in manifest.json. init_app() loads the manifest (building it first
+if it is missing or older than the sources) and replaces the templates'
+url_for so that url_for('static', filename='base.css') points at the
+fingerprinted file under /assets/. Those URLs change whenever the content
+does, so they are served with an immutable one-year Cache-Control and the
+best precompressed variant the client accepts.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import re
+from datetime import datetime, timezone
+
+from flask import abort, request, send_from_directory, url_for as flask_url_for
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+logger = logging.getLogger(__name__)
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(ROOT, 'static')
+DEFAULT_ASSET_DIR = os.path.join(STATIC_DIR, 'dist')
+MANIFEST = 'manifest.json'
+MAX_AGE = 365 * 24 * 3600
+
+# Bundle name (as requested through url_for('static', filename=...)) -> sources in static/, concatenated in order.
+# home.html and the base.html pages load disjoint sheets that style the same selectors, so they stay separate bundles.
+BUNDLES = {
+    'base.css': ['base.css'],
+    'style.css': ['style.css'],
+}
+
+# Content-Encoding -> file suffix, in order of preference
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+_CSS_TOKENS = re.compile(r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')|/\*.*?\*/|\s+''', re.S)
+_CSS_PUNCTUATION = re.compile(r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')'''
+                              # The last declaration needs no semicolon
+                              r'''|\s*;\s*(\})\s*'''
+                              r'''|\s*([{};,>])\s*'''
+                              # Space before ':' only inside declarations (a ';' or '}' comes before any '{');
+                              # in selectors "a :hover" differs from "a:hover"
+                              r'''|\s*:\s*(?=[^{};"']*[;}])|:\s+''')
+
+
+def minify_css(css):
+    """Drop comments and redundant whitespace (quoted strings are left untouched)"""
+    # Comments become a space so that a/**/b does not turn into ab
+    css = _CSS_TOKENS.sub(lambda m: m.group(1) or ' ', css)
+    return _CSS_PUNCTUATION.sub(lambda m: m.group(1) or m.group(2) or m.group(3) or ':', css).strip()
+
+
+def _write(path, data):
+    # Atomic, so concurrent workers building at startup never serve a partial file
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def _read_manifest(asset_dir):
+    try:
+        with open(os.path.join(asset_dir, MANIFEST), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def prune(asset_dir, bundles, keep):
+    """Delete fingerprinted builds of bundles (and their .gz/.br) not named in keep; returns the count"""
+    patterns = [re.compile(re.escape(stem) + r'\.[0-9a-f]{12}' + re.escape(ext) + r'(\.gz|\.br)?$')
+                for stem, ext in map(os.path.splitext, bundles)]
+    removed = 0
+    for filename in os.listdir(asset_dir):
+        match = next((m for m in (p.match(filename) for p in patterns) if m), None)
+        if match is None or filename[:len(filename) - len(match.group(1) or '')] in keep:
+            continue
+        try:
+            os.remove(os.path.join(asset_dir, filename))
+            removed += 1
+        except OSError:
+            pass
+    return removed
+
+
+def build(static_dir=STATIC_DIR, asset_dir=DEFAULT_ASSET_DIR, bundles=None):
+    """Build every bundle; returns the manifest {bundle name: fingerprinted file name}
+
+    Older fingerprinted files are pruned, except those of the previous build:
+    pages rendered by workers still on the old manifest keep working.
+    """
+    os.makedirs(asset_dir, exist_ok=True)
+    bundles = bundles or BUNDLES
+    previous = _read_manifest(asset_dir)
+    manifest = {}
+    for name, sources in bundles.items():
+        parts = []
+        for source in sources:
+            with open(os.path.join(static_dir, source), encoding='utf-8') as f:
+                parts.append(f.read())
+        text = '\n'.join(parts)
+        if name.endswith('.css'):
+            text = minify_css(text)
+        data = text.encode('utf-8')
+
+        stem, ext = os.path.splitext(name)
+        filename = f'{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}'
+        path = os.path.join(asset_dir, filename)
+        _write(path, data)
+        # mtime=0 keeps the .gz byte-identical across builds
+        _write(path + '.gz', gzip.compress(data, compresslevel=9, mtime=0))
+        if brotli is not None:
+            _write(path + '.br', brotli.compress(data, quality=11))
+        manifest[name] = filename
+
+    _write(os.path.join(asset_dir, MANIFEST), json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+    prune(asset_dir, bundles, set(manifest.values()) | set(previous.values()))
+    return manifest
+
+
+def load_manifest(static_dir=STATIC_DIR, asset_dir=DEFAULT_ASSET_DIR, bundles=None):
+    """The current manifest, rebuilt first if it is missing or older than any source"""
+    path = os.path.join(asset_dir, MANIFEST)
+    bundles = bundles or BUNDLES
+    try:
+        built_at = os.path.getmtime(path)
+        stale = any(os.path.getmtime(os.path.join(static_dir, source)) > built_at
+                    for sources in bundles.values() for source in sources)
+    except OSError:
+        stale = True
+    if stale:
+        manifest = build(static_dir, asset_dir, bundles)
+        logger.info("Built %d static asset bundle(s)", len(manifest), extra={'data': {'asset_dir': asset_dir}})
+        return manifest
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def version(manifest):
+    """Short digest of a manifest, for validators of pages that link the bundles"""
+    return hashlib.sha256(json.dumps(manifest, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+
+
+def init_app(app, asset_dir=None):
+    """Serve built bundles under /assets/ and point url_for('static', ...) at them"""
+    asset_dir = asset_dir or os.environ.get('ASSET_DIR', DEFAULT_ASSET_DIR)
+    try:
+        manifest = load_manifest(app.static_folder, asset_dir)
+    except OSError:
+        # Read-only deploy without a prebuilt manifest: keep serving static/ as is
+        logger.exception("Static asset build failed; serving unbundled static files")
+        return {}
+
+    @app.route('/assets/<path:filename>')
+    def assets(filename):
+        """Fingerprinted bundle, precompressed when the client accepts it"""
+        if filename == MANIFEST:
+            abort(404)
+        mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+        for encoding, suffix in ENCODINGS:
+            if encoding in request.accept_encodings and os.path.exists(os.path.join(asset_dir, filename + suffix)):
+                response = send_from_directory(asset_dir, filename + suffix, mimetype=mimetype, max_age=MAX_AGE)
+                response.content_encoding = encoding
+                break
+        else:
+            response = send_from_directory(asset_dir, filename, mimetype=mimetype, max_age=MAX_AGE)
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        response.vary.add('Accept-Encoding')
+        return response
+
+    def url_for(endpoint, **values):
+        if endpoint == 'static' and values.get('filename') in manifest:
+            values['filename'] = manifest[values['filename']]
+            endpoint = 'assets'
+        return flask_url_for(endpoint, **values)
+
+    app.jinja_env.globals['url_for'] = url_for
+    app.extensions['assets'] = manifest
+    app.extensions['assets_built_at'] = datetime.fromtimestamp(
+        int(os.path.getmtime(os.path.join(asset_dir, MANIFEST))), timezone.utc)
+    return manifest
+
+
+if __name__ == '__main__':
+    import log_config
+    log_config.configure()
+    asset_dir = os.environ.get('ASSET_DIR', DEFAULT_ASSET_DIR)
+    manifest = build(asset_dir=asset_dir)
+    for name, filename in sorted(manifest.items()):
+        sources = sum(os.path.getsize(os.path.join(STATIC_DIR, source)) for source in BUNDLES[name])
+        sizes = ', '.join(f'{suffix[1:]} {os.path.getsize(os.path.join(asset_dir, filename + suffix))}'
+                          for _, suffix in ENCODINGS
+                          if os.path.exists(os.path.join(asset_dir, filename + suffix)))
+        print(f"{name} -> {filename}: {sources} -> {os.path.getsize(os.path.join(asset_dir, filename))} bytes ({sizes})")
@@ -0,0 +1,158 @@
+"""Deterministic, hash-based experiment assignment.
+
+A user's arm is a pure function of (experiment salt, username): the pair is
+hashed to a point in [0, 1) and mapped onto holdout / ramp-up / weighted arm
+ranges. No DB round-trip or RNG state is involved, so the same user always
+lands in the same arm on every worker, and results are memoized.
+
+The kelompok experiment (stored on users at registration) is configured
+with EXPERIMENT_CONFIG (JSON), e.g.
+
+    {"name": "kelompok", "salt": "kelompok-v1", "baseline": "control",
+     "holdout": 0.05, "ramp": 0.5,
+     "arms": [{"name": "control", "weight": 1, "label": "Kontrol"},
+              {"name": "experiment", "weight": 1, "personalized": true, "label": "Eksperimen"}]}
+
+Further concurrent experiments (content variant, question set, ...) are a
+JSON list of the same objects in EXPERIMENTS_CONFIG. Each has its own salt,
+so assignments are independent across experiments and never stored.
+"""
+import hashlib
+import json
+import os
+from functools import lru_cache
+
+
+HOLDOUT_ARM = 'holdout'
+# Shown on admin pages; held-out users themselves see the baseline label
+HOLDOUT_LABEL = 'Holdout'
+
+
+@lru_cache(maxsize=65536)
+def hash_unit(salt, username, purpose=''):
+    """Uniform point in [0, 1) derived from salt, username and purpose"""
+    digest = hashlib.sha256(f'{salt}:{purpose}:{username}'.encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') / 2 ** 64
+
+
+class Arm:
+    def __init__(self, name, weight=1.0, personalized=False, label=None):
+        if weight < 0:
+            raise ValueError(f"Arm {name} has negative weight")
+        self.name = name
+        self.weight = float(weight)
+        # Personalized arms get ML-recommended education content
+        self.personalized = personalized
+        self.label = label or name
+
+    def to_dict(self):
+        return {'name': self.name, 'weight': self.weight, 'personalized': self.personalized, 'label': self.label}
+
+
+class Experiment:
+    """N weighted arms plus an optional holdout and ramp-up percentage"""
+
+    def __init__(self, name, salt, arms, baseline='control', holdout=0.0, ramp=1.0):
+        if not arms:
+            raise ValueError("An experiment needs at least one arm")
+        if not 0.0 <= holdout < 1.0 or not 0.0 <= ramp <= 1.0:
+            raise ValueError("holdout must be in [0, 1) and ramp in [0, 1]")
+        self.name = name
+        self.salt = salt
+        self.arms = {arm.name: arm for arm in arms}
+        if baseline not in self.arms:
+            raise ValueError(f"Baseline arm {baseline} is not one of the arms")
+        self.baseline = baseline
+        self.holdout = holdout
+        self.ramp = ramp
+
+        total = sum(arm.weight for arm in arms)
+        if total <= 0:
+            raise ValueError("Arm weights must sum to a positive number")
+        self._boundaries = []
+        cumulative = 0.0
+        for arm in arms:
+            cumulative += arm.weight / total
+            self._boundaries.append((cumulative, arm.name))
+
+    @classmethod
+    def from_dict(cls, config):
+        arms = [Arm(a['name'], a.get('weight', 1.0), a.get('personalized', False), a.get('label'))
+                for a in config['arms']]
+        return cls(config['name'], config.get('salt', config['name']), arms,
+                   baseline=config.get('baseline', 'control'),
+                   holdout=config.get('holdout', 0.0), ramp=config.get('ramp', 1.0))
+
+    def assign(self, username):
+        """Arm name for a username (HOLDOUT_ARM for held-out users)"""
+        if self.holdout and hash_unit(self.salt, username, 'holdout') < self.holdout:
+            return HOLDOUT_ARM
+        # Users outside the ramp-up get the baseline experience
+        if self.ramp < 1.0 and hash_unit(self.salt, username, 'ramp') >= self.ramp:
+            return self.baseline
+
+        point = hash_unit(self.salt, username, 'arm')
+        for boundary, name in self._boundaries:
+            if point < boundary:
+                return name
+        return self._boundaries[-1][1]
+
+    def is_personalized(self, arm_name):
+        arm = self.arms.get(arm_name)
+        return arm is not None and arm.personalized
+
+    def label(self, arm_name, reveal_holdout=False):
+        # Held-out users see the baseline experience, including its label (admins see HOLDOUT_LABEL)
+        if arm_name == HOLDOUT_ARM:
+            if reveal_holdout:
+                return HOLDOUT_LABEL
+            arm_name = self.baseline
+        arm = self.arms.get(arm_name)
+        return arm.label if arm is not None else arm_name
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'salt': self.salt,
+            'baseline': self.baseline,
+            'holdout': self.holdout,
+            'ramp': self.ramp,
+            'arms': [arm.to_dict() for arm in self.arms.values()],
+        }
+
+
+DEFAULT_EXPERIMENT = {
+    'name': 'kelompok',
+    'salt': 'kelompok-v1',
+    'baseline': 'control',
+    'arms': [
+        {'name': 'control', 'weight': 1, 'label': 'Kontrol'},
+        {'name': 'experiment', 'weight': 1, 'personalized': True, 'label': 'Eksperimen'},
+    ],
+}
+
+
+def load_experiment(environ=None):
+    """The group-assignment experiment from EXPERIMENT_CONFIG, or the 50/50 default"""
+    env = os.environ if environ is None else environ
+    raw = env.get('EXPERIMENT_CONFIG')
+    return Experiment.from_dict(json.loads(raw) if raw else DEFAULT_EXPERIMENT)
+
+
+def load_experiments(primary=None, environ=None):
+    """{name: Experiment} for the kelompok experiment plus those in EXPERIMENTS_CONFIG"""
+    env = os.environ if environ is None else environ
+    primary = primary or load_experiment(env)
+    experiments = {primary.name: primary}
+    for config in json.loads(env.get('EXPERIMENTS_CONFIG') or '[]'):
+        experiment = Experiment.from_dict(config)
+        if experiment.name in experiments:
+            raise ValueError(f"Duplicate experiment name {experiment.name}")
+        experiments[experiment.name] = experiment
+    return experiments
+
+
+def assign_all(experiments, username, stored=None):
+    """{experiment name: arm} for a user; stored overrides computed arms (e.g. users.kelompok)"""
+    stored = stored or {}
+    return {name: stored.get(name) or experiment.assign(username) for name, experiment in experiments.items()}
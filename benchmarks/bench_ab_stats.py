@@ -0,0 +1,58 @@
+"""Benchmark the A/B statistics engine on a synthetic cohort.
+
+    python benchmarks/bench_ab_stats.py --users 100000 --resamples 10000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import experiment_stats
+
+
+def synthetic_outcomes(n, seed=0):
+    rng = np.random.default_rng(seed)
+    kelompok = np.where(rng.random(n) > 0.5, 'experiment', 'control').astype(object)
+    pretest = rng.integers(0, 46, n)
+    lift = np.where(kelompok == 'experiment', 3, 0)
+    posttest = np.clip(pretest + rng.integers(-5, 15, n) + lift, 0, 45)
+    return {
+        'kelompok': kelompok,
+        'improvement': (posttest - pretest).astype(float),
+        'pendidikan': rng.choice(['SMA', 'D3', 'S1', 'S2', 'S3'], n).astype(object),
+        'lokasi': rng.choice(['Jakarta', 'Bandung', 'Surabaya', 'Medan', 'Makassar'], n).astype(object),
+        'usia_band': experiment_stats.usia_band(rng.integers(18, 65, n).tolist()),
+        'level_rekomendasi': rng.choice(['Pemula', 'Menengah', 'Lanjutan'], n).astype(object),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=100000)
+    parser.add_argument('--resamples', type=int, default=10000)
+    args = parser.parse_args()
+
+    data = synthetic_outcomes(args.users)
+    experiment = data['improvement'][data['kelompok'] == 'experiment']
+    control = data['improvement'][data['kelompok'] == 'control']
+
+    start = time.perf_counter()
+    ci = experiment_stats.bootstrap_diff_ci(experiment, control, args.resamples, seed=0)
+    overall = time.perf_counter() - start
+    print(f"overall bootstrap ({args.resamples} resamples, {args.users} users): {overall * 1000:.1f} ms")
+    print(f"  95% CI: [{ci['low']:.3f}, {ci['high']:.3f}]")
+
+    start = time.perf_counter()
+    report = experiment_stats.analyze(data, n_resamples=args.resamples)
+    full = time.perf_counter() - start
+    n_segments = sum(len(v) for v in report['arms']['experiment']['segments'].values())
+    print(f"full report (overall + {n_segments} segments): {full * 1000:.1f} ms")
+    print(f"  p-value: {report['arms']['experiment']['overall']['p_value']:.3g}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,276 @@
+"""Load test of the full user funnel against the real Flask app.
+
+Seeds a scratch database with a synthetic cohort, then drives virtual users
+through register -> login -> dashboard -> profile -> pretest -> education ->
+posttest -> results -> dashboard -> dashboard (plus /admin/analysis every
+--admin-every users) from --concurrency threads. Requests go through the
+in-process test client, or through a local threaded WSGI server with
+--server. Per-route p50/p95/p99 latency, throughput and database queries per
+request (session reads included) are printed and optionally saved as JSON;
+dashboard_repeat is the steady-state view. --baseline compares a run against
+a saved one and exits non-zero on p95 regressions.
+
+    python benchmarks/bench_funnel.py --cohort 100000 --users 500 --concurrency 8 --output funnel.json
+    python benchmarks/bench_funnel.py --users 500 --baseline funnel.json --tolerance 0.25
+"""
+import argparse
+import http.cookiejar
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+import numpy as np
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+
+
+ANSWERS = {q: '9' for q in ('q1', 'q2', 'q3', 'q4', 'q5')}
+PROFILE = {'usia': '30', 'jenis_kelamin': 'P', 'pendidikan': 'S1', 'lokasi': 'Bandung', 'pengalaman': '2',
+           'minat_1': '4', 'minat_2': '3', 'minat_3': '5', 'minat_4': '2', 'minat_5': '3'}
+
+# (route name, method, path, form data, expected status)
+FUNNEL = [
+    ('register', 'POST', '/register', None, 302),
+    ('login', 'POST', '/login', None, 302),
+    ('dashboard', 'GET', '/dashboard', None, 200),
+    ('profile', 'POST', '/profile', PROFILE, 302),
+    ('pretest', 'POST', '/pretest', {q: '5' for q in ANSWERS}, 302),
+    ('education', 'GET', '/education', None, 200),
+    ('posttest', 'POST', '/posttest', ANSWERS, 302),
+    ('results', 'GET', '/results', None, 200),
+    ('dashboard', 'GET', '/dashboard', None, 200),
+    ('dashboard_repeat', 'GET', '/dashboard', None, 200),
+]
+# Sent with every request so the app side can attribute its query count to the funnel step
+ROUTE_HEADER = 'X-Bench-Route'
+ADMIN_STEP = ('admin_analysis', 'GET', '/admin/analysis', None, 200)
+
+
+class TestClientSession:
+    """One virtual user on the in-process test client"""
+
+    def __init__(self, app):
+        self.client = app.test_client()
+
+    def request(self, name, method, path, data):
+        response = self.client.open(path, method=method, data=data, headers={ROUTE_HEADER: name})
+        response.close()
+        return response.status_code
+
+
+class HttpSession:
+    """One virtual user against a real HTTP server, with its own cookie jar and no redirects"""
+
+    class _NoRedirect(urllib.request.HTTPRedirectHandler):
+        def redirect_request(self, *args, **kwargs):
+            return None
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.opener = urllib.request.build_opener(
+            urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar()), self._NoRedirect)
+
+    def request(self, name, method, path, data):
+        body = urllib.parse.urlencode(data).encode() if data is not None else None
+        req = urllib.request.Request(self.base_url + path, data=body, method=method, headers={ROUTE_HEADER: name})
+        try:
+            with self.opener.open(req) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code
+
+
+def seed_cohort(path, size):
+    import generate_data
+    from model import iter_sample_data
+    start = time.perf_counter()
+    generate_data.write_sqlite(iter_sample_data(size, min(size, 100000)), path)
+    return time.perf_counter() - start
+
+
+def percentiles(samples):
+    values = np.asarray(samples) * 1000
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {'p50_ms': float(p50), 'p95_ms': float(p95), 'p99_ms': float(p99),
+            'mean_ms': float(values.mean()), 'max_ms': float(values.max())}
+
+
+def count_queries(app):
+    """Database queries per funnel step, read from the app's per-request instrumentation counter"""
+    from flask import g, request
+    counts = {}
+    lock = threading.Lock()
+
+    @app.teardown_request
+    def record_queries(exception=None):
+        name = request.headers.get(ROUTE_HEADER)
+        if name is None:
+            return
+        with lock:
+            total, requests = counts.get(name, (0, 0))
+            counts[name] = (total + g.get('instrument_db_queries', 0), requests + 1)
+
+    return counts
+
+
+def run(make_session, users, concurrency, admin_every, run_id, query_counts=None):
+    latencies = {}
+    errors = {}
+    lock = threading.Lock()
+    next_user = iter(range(users))
+
+    def worker():
+        local = {}
+        local_errors = {}
+        while True:
+            with lock:
+                n = next(next_user, None)
+            if n is None:
+                break
+            session = make_session()
+            credentials = {'username': f'bench_{run_id}_{n}', 'password': 'bench'}
+            steps = list(FUNNEL)
+            if admin_every and n % admin_every == 0:
+                steps.append(ADMIN_STEP)
+            for name, method, path, data, expected in steps:
+                if name in ('register', 'login'):
+                    data = credentials
+                start = time.perf_counter()
+                status = session.request(name, method, path, data)
+                local.setdefault(name, []).append(time.perf_counter() - start)
+                if status != expected:
+                    local_errors[name] = local_errors.get(name, 0) + 1
+        with lock:
+            for name, samples in local.items():
+                latencies.setdefault(name, []).extend(samples)
+            for name, count in local_errors.items():
+                errors[name] = errors.get(name, 0) + count
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    routes = {}
+    for name, samples in latencies.items():
+        routes[name] = percentiles(samples)
+        routes[name].update({'count': len(samples), 'errors': errors.get(name, 0),
+                             'throughput_rps': len(samples) / elapsed})
+        if query_counts and name in query_counts:
+            queries, requests = query_counts[name]
+            routes[name]['db_queries_per_request'] = queries / requests
+    total = sum(len(samples) for samples in latencies.values())
+    return {'elapsed_s': elapsed, 'requests': total, 'throughput_rps': total / elapsed,
+            'funnels_per_s': users / elapsed, 'routes': routes}
+
+
+def compare(result, baseline, tolerance):
+    """Routes whose p95 grew by more than tolerance (a fraction) over the baseline"""
+    regressions = []
+    for name, base in baseline.get('routes', {}).items():
+        current = result['routes'].get(name)
+        if current is None:
+            continue
+        if current['p95_ms'] > base['p95_ms'] * (1 + tolerance):
+            regressions.append({'route': name, 'baseline_p95_ms': base['p95_ms'], 'p95_ms': current['p95_ms']})
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--cohort', type=int, default=10000, help='Synthetic users seeded before the run')
+    parser.add_argument('--users', type=int, default=200, help='Virtual users driven through the funnel')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--admin-every', type=int, default=20, help='Load /admin/analysis every N users (0 = never)')
+    parser.add_argument('--database', help='Database to seed and use, e.g. database.db (default: a fresh scratch file)')
+    parser.add_argument('--server', action='store_true', help='Go through a local threaded WSGI server')
+    parser.add_argument('--output', help='Write the results as JSON')
+    parser.add_argument('--baseline', help='Previous JSON results to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed p95 growth over the baseline')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench-funnel-')
+    database = args.database or os.path.join(workdir, 'database.db')
+    # The app reads its configuration at import time
+    os.environ['DATABASE_PATH'] = database
+    os.environ.setdefault('MODEL_DIR', os.path.join(workdir, 'models'))
+    os.environ.setdefault('LOG_LEVEL', 'WARNING')
+    # Every virtual user shares one client IP; keep the per-IP login limiter out of the measurement
+    os.environ.setdefault('LOGIN_RATE_IP_BURST', str(10 * args.users))
+
+    seed_seconds = seed_cohort(database, args.cohort) if args.cohort else 0.0
+
+    import app as flask_app
+    with flask_app.app.app_context():
+        flask_app.init_db()
+    # Variants without a bundle started training at import; measure with all of them loaded
+    flask_app.model_registry.wait_for_training()
+    query_counts = count_queries(flask_app.app)
+
+    server = None
+    if args.server:
+        import logging
+        from werkzeug.serving import make_server
+        # Werkzeug forces its own logger to INFO; per-request access lines would skew the timings
+        logging.getLogger('werkzeug').setLevel(logging.WARNING)
+        server = make_server('127.0.0.1', 0, flask_app.app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        base_url = f'http://127.0.0.1:{server.server_port}'
+        make_session = lambda: HttpSession(base_url)
+    else:
+        make_session = lambda: TestClientSession(flask_app.app)
+
+    try:
+        result = run(make_session, args.users, args.concurrency, args.admin_every, run_id=int(time.time()),
+                     query_counts=query_counts)
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    result['config'] = {
+        'cohort': args.cohort,
+        'users': args.users,
+        'concurrency': args.concurrency,
+        'admin_every': args.admin_every,
+        'transport': 'wsgi-server' if args.server else 'test-client',
+        'session_backend': os.environ.get('SESSION_BACKEND', 'sqlite'),
+        'seed_seconds': seed_seconds,
+        'db_pool': flask_app.db_pool.metrics(),
+    }
+
+    print(f"{args.users} funnels in {result['elapsed_s']:.1f}s "
+          f"({result['funnels_per_s']:.1f} funnels/s, {result['throughput_rps']:.0f} req/s)")
+    print(f"{'route':<18}{'count':>7}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>9}"
+          f"{'queries':>9}")
+    for name, stats in result['routes'].items():
+        print(f"{name:<18}{stats['count']:>7}{stats['errors']:>8}{stats['p50_ms']:>10.2f}"
+              f"{stats['p95_ms']:>10.2f}{stats['p99_ms']:>10.2f}{stats['throughput_rps']:>9.1f}"
+              f"{stats.get('db_queries_per_request', float('nan')):>9.1f}")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(result, json.load(f), args.tolerance)
+        for r in regressions:
+            print(f"REGRESSION {r['route']}: p95 {r['baseline_p95_ms']:.2f} ms -> {r['p95_ms']:.2f} ms")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+"""Single-row inference benchmark: legacy pandas path vs CompiledPredictor.
+
+Trains a model on generated sample data in a scratch directory, checks that
+both paths agree, then times predictions over a pool of random user_data dicts.
+
+    python benchmarks/bench_inference.py --iterations 2000
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from model import RecommendationModel, NUMERICAL_COLUMNS
+
+
+def legacy_predict(rm, user_data):
+    """The original predict_recommendation body (DataFrame per request, two forest passes)"""
+    user_df = pd.DataFrame([user_data])
+    for col in ['jenis_kelamin', 'lokasi', 'pendidikan']:
+        if col in user_df.columns and col in rm.label_encoders:
+            if user_df[col].iloc[0] in rm.label_encoders[col].classes_:
+                user_df[col] = rm.label_encoders[col].transform([user_df[col].iloc[0]])[0]
+            else:
+                user_df[col] = 0
+    user_df[NUMERICAL_COLUMNS] = rm.scaler.transform(user_df[NUMERICAL_COLUMNS])
+    # The model is fitted on plain arrays (no feature names), so pass one here too
+    X = user_df.to_numpy(dtype=float)
+    prediction = rm.model.predict(X)[0]
+    probability = np.max(rm.model.predict_proba(X))
+    return prediction, probability
+
+
+def sample_users(rm, n):
+    df = rm.generate_sample_data(n).drop(columns='level_rekomendasi')
+    return df.to_dict('records')
+
+
+def timed(fn, users, iterations):
+    start = time.perf_counter()
+    for i in range(iterations):
+        fn(users[i % len(users)])
+    return (time.perf_counter() - start) / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=2000)
+    parser.add_argument('--train-samples', type=int, default=500)
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp())
+    rm = RecommendationModel()
+    rm.train_model(rm.generate_sample_data(args.train_samples))
+    users = sample_users(rm, 200)
+
+    mismatches = 0
+    for user in users:
+        old_label, old_conf = legacy_predict(rm, user)
+        new_label, new_conf = rm.predictor.predict(user)
+        if old_label != new_label or abs(old_conf - new_conf) > 1e-6:
+            mismatches += 1
+    print(f"Agreement: {len(users) - mismatches}/{len(users)}")
+
+    legacy = timed(lambda u: legacy_predict(rm, u), users, args.iterations)
+    fast = timed(rm.predictor.predict, users, args.iterations)
+    print(f"legacy pandas path: {legacy * 1e6:>9.1f} us/prediction")
+    print(f"compiled fast path: {fast * 1e6:>9.1f} us/prediction")
+    print(f"speedup:            {legacy / fast:>9.1f}x")
+
+
+if __name__ == '__main__':
+    main()
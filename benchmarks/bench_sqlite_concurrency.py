@@ -0,0 +1,122 @@
+"""Concurrent read/write benchmark for the SQLite storage configuration.
+
+Runs dashboard-style readers next to pretest-style writers against a scratch
+database, once with the rollback journal defaults and once with the tuned
+StorageConfig (WAL), and prints throughput and busy errors for each.
+
+    python benchmarks/bench_sqlite_concurrency.py --readers 8 --writers 4 --seconds 5
+"""
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import db
+
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS pretest_results
+    (id INTEGER PRIMARY KEY AUTOINCREMENT,
+     user_id INTEGER NOT NULL,
+     answers TEXT NOT NULL,
+     score INTEGER NOT NULL,
+     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)
+'''
+
+
+def seed(path, rows):
+    conn = sqlite3.connect(path)
+    conn.execute(SCHEMA)
+    conn.executemany('INSERT INTO pretest_results (user_id, answers, score) VALUES (?, ?, ?)',
+                     ((i % 1000, '{}', i % 100) for i in range(rows)))
+    conn.commit()
+    conn.close()
+
+
+def run(storage, readers, writers, seconds, rows):
+    workdir = tempfile.mkdtemp()
+    path = os.path.join(workdir, 'bench.db')
+    seed(path, rows)
+
+    pool = db.ConnectionPool(path, size=readers + writers, storage=storage)
+    stop = threading.Event()
+    counts = {'reads': 0, 'writes': 0, 'busy_errors': 0}
+    lock = threading.Lock()
+
+    def reader(n):
+        done = 0
+        conn = pool.acquire()
+        while not stop.is_set():
+            conn.execute('SELECT * FROM pretest_results WHERE user_id = ? ORDER BY created_at DESC LIMIT 1',
+                         (done % 1000,)).fetchone()
+            done += 1
+        pool.release()
+        with lock:
+            counts['reads'] += done
+
+    def writer(n):
+        done = errors = 0
+        conn = pool.acquire()
+        while not stop.is_set():
+            try:
+                db.execute_write(conn, [
+                    ('INSERT INTO pretest_results (user_id, answers, score) VALUES (?, ?, ?)',
+                     (done % 1000, '{}', done % 100)),
+                ], storage)
+                done += 1
+            except sqlite3.OperationalError as e:
+                if not db.is_busy_error(e):
+                    raise
+                errors += 1
+        pool.release()
+        with lock:
+            counts['writes'] += done
+            counts['busy_errors'] += errors
+
+    threads = [threading.Thread(target=reader, args=(i,)) for i in range(readers)]
+    threads += [threading.Thread(target=writer, args=(i,)) for i in range(writers)]
+    for t in threads:
+        t.start()
+    time.sleep(seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    pool.close_all()
+
+    return {
+        'reads_per_sec': counts['reads'] / seconds,
+        'writes_per_sec': counts['writes'] / seconds,
+        'busy_errors': counts['busy_errors'],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--rows', type=int, default=50000)
+    args = parser.parse_args()
+
+    configs = {
+        'default (DELETE journal, synchronous=FULL)': db.StorageConfig(
+            journal_mode='DELETE', synchronous='FULL', mmap_size=0, cache_size=-2000,
+            busy_timeout_ms=5000, write_retries=0),
+        'tuned (StorageConfig.from_env)': db.StorageConfig.from_env(),
+    }
+
+    for name, storage in configs.items():
+        result = run(storage, args.readers, args.writers, args.seconds, args.rows)
+        print(f"{name}")
+        print(f"  reads/s:  {result['reads_per_sec']:>10.0f}")
+        print(f"  writes/s: {result['writes_per_sec']:>10.0f}")
+        print(f"  busy errors: {result['busy_errors']}")
+
+
+if __name__ == '__main__':
+    main()
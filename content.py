@@ -0,0 +1,119 @@
+"""Education content and cached rendering of the education pages.
+
+The material is loaded once from data/education_content.json (override with
+EDUCATION_CONTENT_PATH). The `content` block of an education template
+depends only on (template, level, kelompok), so it is rendered once per key
+and reused. Each request then only renders base.html around the cached
+fragment, because the navigation and flash messages are per user.
+
+Responses carry an ETag (fragment digest + user + asset version) and
+Last-Modified (content file / template / asset build mtime), so a repeat view
+gets a 304 without rendering.
+"""
+import hashlib
+import json
+import os
+import threading
+from datetime import datetime, timezone
+
+from flask import Response, make_response, request
+from markupsafe import Markup
+
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'education_content.json')
+
+
+def _mtime(path):
+    return datetime.fromtimestamp(int(os.path.getmtime(path)), timezone.utc)
+
+
+class ContentLibrary:
+    def __init__(self, path=None):
+        self.path = path or os.environ.get('EDUCATION_CONTENT_PATH', DEFAULT_PATH)
+        with open(self.path, encoding='utf-8') as f:
+            data = json.load(f)
+        self.levels = data['personalized']
+        self.default_level = data.get('default_level', 'Pemula')
+        self.static_content = data['static']
+        self.last_modified = _mtime(self.path)
+
+    def personalized(self, level):
+        """Content for a recommended level (unknown levels get the default level)"""
+        return self.levels.get(level, self.levels[self.default_level])
+
+    def static(self):
+        return self.static_content
+
+
+class Fragment:
+    def __init__(self, html, last_modified):
+        self.html = html
+        self.digest = hashlib.sha256(html.encode('utf-8')).hexdigest()[:20]
+        self.last_modified = last_modified
+
+
+class FragmentCache:
+    """Rendered template blocks keyed by (template, level, kelompok)"""
+
+    def __init__(self, jinja_env, library, block='content'):
+        self.jinja_env = jinja_env
+        self.library = library
+        self.block = block
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, template_name, level, kelompok, content):
+        key = (template_name, level, kelompok)
+        fragment = self._entries.get(key)
+        if fragment is not None:
+            with self._lock:
+                self.hits += 1
+            return fragment
+
+        template = self.jinja_env.get_template(template_name)
+        context = template.new_context({'content': content, 'kelompok': kelompok})
+        html = Markup(''.join(template.blocks[self.block](context)))
+        last_modified = self.library.last_modified
+        if template.filename and os.path.exists(template.filename):
+            last_modified = max(last_modified, _mtime(template.filename))
+        fragment = Fragment(html, last_modified)
+        with self._lock:
+            self.misses += 1
+            self._entries[key] = fragment
+        return fragment
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {'size': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+def conditional_response(fragment, user_key, render, allow_not_modified=True, last_modified=None):
+    """304 when the client's validators match, otherwise render(); both carry ETag/Last-Modified.
+
+    user_key covers the per-user parts of the page around the fragment (and the
+    asset version); last_modified, if later, replaces the fragment's own time.
+    """
+    if last_modified is None or last_modified < fragment.last_modified:
+        last_modified = fragment.last_modified
+    etag = hashlib.sha256(f'{fragment.digest}:{user_key}'.encode('utf-8')).hexdigest()[:32]
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains(etag)
+    else:
+        not_modified = request.if_modified_since is not None and last_modified <= request.if_modified_since
+    if allow_not_modified and not_modified:
+        response = Response(status=304)
+    else:
+        response = make_response(render())
+    response.set_etag(etag)
+    response.last_modified = last_modified
+    # Per-user page: browsers may keep it but must revalidate; shared caches must not
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.vary.add('Cookie')
+    return response
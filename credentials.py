@@ -0,0 +1,172 @@
+"""Password hashing and login rate limiting.
+
+Passwords are stored as werkzeug hashes ("scrypt:32768:8:1$salt$hash"); the
+method and cost come from PASSWORD_HASH_METHOD. Hashing runs on a bounded
+thread pool (hashlib's scrypt/pbkdf2 release the GIL): at most
+PASSWORD_HASH_WORKERS hashes run at once, PASSWORD_HASH_MAX_PENDING more may
+wait, and beyond that callers get HasherBusy instead of piling up CPU work.
+
+Rows still holding a plaintext password (or a hash with an older method) are
+verified once the old way and rehashed with the current method on a
+successful login, so existing users migrate without a reset.
+
+TokenBucketLimiter rejects floods per username and per client IP with a dict
+lookup, before any hashing is attempted. Behind a reverse proxy set
+PROXY_FIX_X_FOR to the number of proxies, so the client IP is taken from
+X-Forwarded-For instead of the proxy's own address.
+"""
+import hmac
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from werkzeug.security import check_password_hash, generate_password_hash
+
+DEFAULT_METHOD = 'scrypt:32768:8:1'
+HASH_PREFIXES = ('scrypt:', 'pbkdf2:')
+
+
+class HasherBusy(Exception):
+    """Every hashing slot is taken"""
+
+
+def is_hashed(stored):
+    return stored.startswith(HASH_PREFIXES) and stored.count('$') == 2
+
+
+class PasswordHasher:
+    def __init__(self, method=DEFAULT_METHOD, max_workers=2, max_pending=32, timeout=10.0):
+        self.method = method
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='password-hash')
+        # Running + waiting hashes; beyond this callers get HasherBusy
+        self._slots = threading.BoundedSemaphore(max_workers + max_pending)
+        self._lock = threading.Lock()
+        self._counts = {'hashed': 0, 'verified': 0, 'rejected_busy': 0, 'rehashed': 0}
+        # Verified against for unknown usernames so they take as long as a wrong password
+        self._dummy_hash = generate_password_hash('dummy-password', method=self.method)
+        # werkzeug writes every parameter into the hash ('pbkdf2' -> 'pbkdf2:sha256:1000000'),
+        # so stored hashes are compared against that rather than the configured spelling
+        self._full_method = self._dummy_hash.split('$', 1)[0]
+
+    @classmethod
+    def from_env(cls, environ=None):
+        env = os.environ if environ is None else environ
+        return cls(method=env.get('PASSWORD_HASH_METHOD', DEFAULT_METHOD),
+                   max_workers=int(env.get('PASSWORD_HASH_WORKERS', min(4, os.cpu_count() or 1))),
+                   max_pending=int(env.get('PASSWORD_HASH_MAX_PENDING', 32)),
+                   timeout=float(env.get('PASSWORD_HASH_TIMEOUT', 10)))
+
+    def _count(self, name):
+        with self._lock:
+            self._counts[name] += 1
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(blocking=False):
+            self._count('rejected_busy')
+            raise HasherBusy("Password hashing pool is saturated")
+        try:
+            future = self._executor.submit(fn, *args)
+        except RuntimeError:
+            # Executor shut down
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future.result(timeout=self.timeout)
+
+    def hash(self, password):
+        self._count('hashed')
+        return self._run(generate_password_hash, password, self.method)
+
+    def needs_rehash(self, stored):
+        return stored.split('$', 1)[0] != self._full_method
+
+    def verify(self, stored, password):
+        """True if password matches stored (a hash, or a legacy plaintext value)"""
+        self._count('verified')
+        if stored is None:
+            self._run(check_password_hash, self._dummy_hash, password)
+            return False
+        if not is_hashed(stored):
+            return hmac.compare_digest(stored.encode('utf-8'), password.encode('utf-8'))
+        return self._run(check_password_hash, stored, password)
+
+    def record_rehash(self):
+        self._count('rehashed')
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._counts)
+        data['method'] = self.method
+        return data
+
+
+class TokenBucketLimiter:
+    """Per-key token buckets (capacity burst, refilled at rate tokens/s), bounded to maxsize keys"""
+
+    def __init__(self, capacity, rate, maxsize=100000):
+        self.capacity = capacity
+        self.rate = rate
+        self.maxsize = maxsize
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.rejected = 0
+
+    def consume(self, key, tokens=1):
+        """(allowed, seconds until enough tokens would be available)"""
+        now = time.monotonic()
+        with self._lock:
+            level, updated = self._buckets.get(key, (self.capacity, now))
+            level = min(self.capacity, level + (now - updated) * self.rate)
+            allowed = level >= tokens
+            if allowed:
+                level -= tokens
+                self.allowed += 1
+            else:
+                self.rejected += 1
+            self._buckets[key] = (level, now)
+            self._buckets.move_to_end(key)
+            # Evicting the least recently seen key forgets a bucket, which only ever refills it
+            while len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        retry_after = 0.0 if allowed else (tokens - level) / self.rate if self.rate else float('inf')
+        return allowed, retry_after
+
+    def stats(self):
+        with self._lock:
+            return {'keys': len(self._buckets), 'capacity': self.capacity, 'rate': self.rate,
+                    'allowed': self.allowed, 'rejected': self.rejected}
+
+
+class LoginLimiter:
+    """Username and client IP buckets checked together before any password work"""
+
+    def __init__(self, per_user, per_ip):
+        self.per_user = per_user
+        self.per_ip = per_ip
+
+    @classmethod
+    def from_env(cls, environ=None):
+        env = os.environ if environ is None else environ
+        maxsize = int(env.get('LOGIN_RATE_MAX_KEYS', 100000))
+        return cls(TokenBucketLimiter(float(env.get('LOGIN_RATE_USER_BURST', 5)),
+                                      float(env.get('LOGIN_RATE_USER_PER_MINUTE', 5)) / 60, maxsize),
+                   TokenBucketLimiter(float(env.get('LOGIN_RATE_IP_BURST', 30)),
+                                      float(env.get('LOGIN_RATE_IP_PER_MINUTE', 60)) / 60, maxsize))
+
+    def check(self, ip, username=None):
+        """Seconds to wait, or 0 if the attempt may proceed"""
+        allowed, retry_after = self.per_ip.consume(ip)
+        if not allowed:
+            return retry_after
+        if username is not None:
+            allowed, retry_after = self.per_user.consume(username.lower())
+            if not allowed:
+                return retry_after
+        return 0
+
+    def stats(self):
+        return {'per_user': self.per_user.stats(), 'per_ip': self.per_ip.stats()}
@@ -0,0 +1,264 @@
+import sqlite3
+import threading
+import queue
+import random
+import time
+import os
+
+from flask import g
+
+
+SQLITE_BUSY = 5
+SQLITE_LOCKED = 6
+
+
+class StorageConfig:
+    """SQLite pragmas and write-retry policy, tunable per deployment via env"""
+
+    def __init__(self, journal_mode='WAL', synchronous='NORMAL', mmap_size=268435456,
+                 cache_size=-65536, busy_timeout_ms=5000, write_retries=5, retry_backoff_ms=25):
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        self.mmap_size = mmap_size
+        # Negative cache_size is in KiB (SQLite convention), so -65536 = 64 MiB
+        self.cache_size = cache_size
+        self.busy_timeout_ms = busy_timeout_ms
+        self.write_retries = write_retries
+        self.retry_backoff_ms = retry_backoff_ms
+
+    @classmethod
+    def from_env(cls, environ=None):
+        env = os.environ if environ is None else environ
+        return cls(
+            journal_mode=env.get('SQLITE_JOURNAL_MODE', 'WAL'),
+            synchronous=env.get('SQLITE_SYNCHRONOUS', 'NORMAL'),
+            mmap_size=int(env.get('SQLITE_MMAP_SIZE', 268435456)),
+            cache_size=int(env.get('SQLITE_CACHE_SIZE', -65536)),
+            busy_timeout_ms=int(env.get('SQLITE_BUSY_TIMEOUT_MS', 5000)),
+            write_retries=int(env.get('DB_WRITE_RETRIES', 5)),
+            retry_backoff_ms=int(env.get('DB_RETRY_BACKOFF_MS', 25)),
+        )
+
+    def apply(self, conn):
+        """Set the per-connection pragmas (journal_mode is persistent in the file)"""
+        conn.execute(f'PRAGMA busy_timeout = {int(self.busy_timeout_ms)}')
+        conn.execute(f'PRAGMA journal_mode = {self.journal_mode}')
+        conn.execute(f'PRAGMA synchronous = {self.synchronous}')
+        conn.execute(f'PRAGMA mmap_size = {int(self.mmap_size)}')
+        conn.execute(f'PRAGMA cache_size = {int(self.cache_size)}')
+
+    def as_dict(self):
+        return dict(vars(self))
+
+
+def is_busy_error(error):
+    """True for SQLITE_BUSY / SQLITE_LOCKED ("database is locked")"""
+    if not isinstance(error, sqlite3.OperationalError):
+        return False
+    code = getattr(error, 'sqlite_errorcode', None)
+    if code is not None:
+        return code & 0xff in (SQLITE_BUSY, SQLITE_LOCKED)
+    message = str(error).lower()
+    return 'locked' in message or 'busy' in message
+
+
+def run_write(conn, work, storage=None):
+    """Run work(conn) in a BEGIN IMMEDIATE transaction, retrying on SQLITE_BUSY.
+
+    Taking the write lock up front means contention surfaces at BEGIN, before
+    any statement ran, so the whole unit can be retried with backoff.
+    """
+    storage = storage or StorageConfig()
+    attempt = 0
+    while True:
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            result = work(conn)
+            conn.commit()
+            return result
+        except Exception as e:
+            if conn.in_transaction:
+                conn.rollback()
+            if not is_busy_error(e) or attempt >= storage.write_retries:
+                raise
+            delay = storage.retry_backoff_ms / 1000.0 * (2 ** attempt)
+            time.sleep(delay * random.uniform(0.5, 1.5))
+            attempt += 1
+
+
+def execute_write(conn, statements, storage=None):
+    """Execute a list of (sql, params) pairs as one retried write transaction"""
+    def work(c):
+        for sql, params in statements:
+            c.execute(sql, params)
+    run_write(conn, work, storage)
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection slot frees up within the checkout timeout"""
+
+
+class PoolStats:
+    """Counters used to size the pool (checkout wait time and hit rate)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.hits = 0
+        self.misses = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def record_checkout(self, waited, hit):
+        with self._lock:
+            self.checkouts += 1
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+            self.wait_total += waited
+            self.wait_max = max(self.wait_max, waited)
+
+    def record_timeout(self):
+        with self._lock:
+            self.timeouts += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'checkouts': self.checkouts,
+                'hits': self.hits,
+                'misses': self.misses,
+                'timeouts': self.timeouts,
+                'hit_rate': self.hits / self.checkouts if self.checkouts else 0.0,
+                'wait_avg_ms': self.wait_total / self.checkouts * 1000 if self.checkouts else 0.0,
+                'wait_max_ms': self.wait_max * 1000,
+            }
+
+
+class ConnectionPool:
+    """Bounded pool of SQLite connections, one checked out per worker thread.
+
+    A thread keeps the same connection for the whole app context and gives it
+    back on teardown, so a request no longer pays connect/close per query.
+    """
+
+    def __init__(self, database, size=8, cached_statements=256, timeout=30.0, storage=None, factory=None):
+        self.database = database
+        # sqlite3.Connection subclass to create, e.g. an instrumented one
+        self.factory = factory or sqlite3.Connection
+        self.storage = storage or StorageConfig()
+        self.size = size
+        self.cached_statements = cached_statements
+        self.timeout = timeout
+        self.stats = PoolStats()
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._open = 0
+
+    def _connect(self):
+        conn = sqlite3.connect(self.database,
+                               timeout=self.storage.busy_timeout_ms / 1000.0,
+                               cached_statements=self.cached_statements,
+                               check_same_thread=False,
+                               factory=self.factory)
+        conn.row_factory = sqlite3.Row
+        self.storage.apply(conn)
+        with self._lock:
+            self._open += 1
+        return conn
+
+    def acquire(self):
+        """Return this thread's connection, checking one out if needed"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            return conn
+
+        start = time.perf_counter()
+        if not self._slots.acquire(timeout=self.timeout):
+            self.stats.record_timeout()
+            raise PoolTimeout(f"No database connection available after {self.timeout}s")
+
+        try:
+            conn = self._idle.get_nowait()
+            hit = True
+        except queue.Empty:
+            try:
+                conn = self._connect()
+            except Exception:
+                self._slots.release()
+                raise
+            hit = False
+
+        self.stats.record_checkout(time.perf_counter() - start, hit)
+        self._local.conn = conn
+        return conn
+
+    def release(self):
+        """Give this thread's connection back to the pool"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            return
+        self._local.conn = None
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+            self._idle.put(conn)
+        except sqlite3.Error:
+            # Broken connection - drop it and let the next checkout reconnect
+            with self._lock:
+                self._open -= 1
+        finally:
+            self._slots.release()
+
+    def close_all(self):
+        """Close every idle connection (used on shutdown and in benchmarks)"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._open -= 1
+
+    def metrics(self):
+        data = self.stats.snapshot()
+        data.update({
+            'size': self.size,
+            'open': self._open,
+            'idle': self._idle.qsize(),
+            'cached_statements': self.cached_statements,
+            'storage': self.storage.as_dict(),
+        })
+        return data
+
+
+def init_app(app):
+    """Create the pool from app.config and return connections on teardown"""
+    pool = ConnectionPool(app.config['DATABASE'],
+                          size=app.config['DB_POOL_SIZE'],
+                          cached_statements=app.config['DB_CACHED_STATEMENTS'],
+                          timeout=app.config['DB_POOL_TIMEOUT'],
+                          storage=app.config['DB_STORAGE'],
+                          factory=app.config.get('DB_CONNECTION_FACTORY'))
+    app.extensions['db_pool'] = pool
+
+    @app.teardown_appcontext
+    def release_db_connection(exception=None):
+        if g.pop('db_conn', None) is not None:
+            pool.release()
+
+    return pool
+
+
+def get_connection(pool):
+    """Pooled connection for the current app context"""
+    conn = g.get('db_conn')
+    if conn is None:
+        conn = pool.acquire()
+        g.db_conn = conn
+    return conn
@@ -0,0 +1,198 @@
+"""A/B statistics for improvement (posttest - pretest) by kelompok.
+
+Welch's t-test, Cohen's d / Hedges' g and bootstrap confidence intervals for
+the difference in mean improvement between each arm and the control arm,
+overall and per segment (pendidikan, lokasi, usia band, level_rekomendasi).
+
+Improvement scores are small integers, so a bootstrap resample of a group is
+a multinomial draw over its distinct values: 10k resamples cost
+O(resamples x distinct values) instead of O(resamples x users). Groups with
+many distinct values fall back to batched index resampling.
+"""
+import math
+import threading
+
+import numpy as np
+
+from assignment import HOLDOUT_ARM
+
+try:
+    from scipy import stats as scipy_stats
+except ImportError:
+    scipy_stats = None
+
+
+SEGMENT_COLUMNS = ['pendidikan', 'lokasi', 'usia_band', 'level_rekomendasi']
+USIA_BANDS = [25, 35, 45, 55]
+USIA_BAND_LABELS = ['<25', '25-34', '35-44', '45-54', '55+']
+
+# Above this many distinct values the multinomial trick stops paying off
+MAX_DISTINCT_FOR_MULTINOMIAL = 2048
+# Elements per batch for index resampling (bounds memory to ~32 MB of int64)
+BOOTSTRAP_BATCH_ELEMENTS = 4_000_000
+
+
+def _t_sf(t, df):
+    """Survival function of Student's t (normal approximation without scipy)"""
+    if scipy_stats is not None:
+        return float(scipy_stats.t.sf(t, df))
+    return 0.5 * math.erfc(t / math.sqrt(2))
+
+
+def welch_from_summary(n1, mean1, var1, n2, mean2, var2):
+    """Welch's t-test for mean1 - mean2 from per-group n, mean and sample variance"""
+    if n1 < 2 or n2 < 2:
+        return {'t': None, 'df': None, 'p_value': None}
+    se1, se2 = var1 / n1, var2 / n2
+    se = math.sqrt(se1 + se2)
+    if se == 0:
+        return {'t': None, 'df': None, 'p_value': None}
+    t = (mean1 - mean2) / se
+    df = (se1 + se2) ** 2 / (se1 ** 2 / (n1 - 1) + se2 ** 2 / (n2 - 1))
+    return {'t': t, 'df': df, 'p_value': min(1.0, 2 * _t_sf(abs(t), df))}
+
+
+def welch_t_test(a, b):
+    a, b = np.asarray(a, dtype=float), np.asarray(b, dtype=float)
+    return welch_from_summary(len(a), a.mean() if len(a) else 0.0, a.var(ddof=1) if len(a) > 1 else 0.0,
+                              len(b), b.mean() if len(b) else 0.0, b.var(ddof=1) if len(b) > 1 else 0.0)
+
+
+def effect_size(a, b):
+    """Cohen's d (pooled SD) and Hedges' small-sample corrected g"""
+    a, b = np.asarray(a, dtype=float), np.asarray(b, dtype=float)
+    n1, n2 = len(a), len(b)
+    if n1 < 2 or n2 < 2:
+        return {'cohens_d': None, 'hedges_g': None}
+    pooled = math.sqrt(((n1 - 1) * a.var(ddof=1) + (n2 - 1) * b.var(ddof=1)) / (n1 + n2 - 2))
+    if pooled == 0:
+        return {'cohens_d': None, 'hedges_g': None}
+    d = (a.mean() - b.mean()) / pooled
+    return {'cohens_d': d, 'hedges_g': d * (1 - 3 / (4 * (n1 + n2) - 9))}
+
+
+def bootstrap_means(values, n_resamples, rng):
+    """Means of n_resamples bootstrap resamples of values, computed in batches"""
+    values = np.asarray(values, dtype=float)
+    n = len(values)
+    distinct, counts = np.unique(values, return_counts=True)
+
+    if len(distinct) <= MAX_DISTINCT_FOR_MULTINOMIAL:
+        draws = rng.multinomial(n, counts / n, size=n_resamples)
+        return draws @ distinct / n
+
+    means = np.empty(n_resamples)
+    batch = max(1, BOOTSTRAP_BATCH_ELEMENTS // n)
+    for start in range(0, n_resamples, batch):
+        size = min(batch, n_resamples - start)
+        idx = rng.integers(0, n, size=(size, n))
+        means[start:start + size] = values[idx].mean(axis=1)
+    return means
+
+
+def bootstrap_diff_ci(a, b, n_resamples=10000, alpha=0.05, seed=None):
+    """Percentile bootstrap CI for mean(a) - mean(b)"""
+    if len(a) == 0 or len(b) == 0:
+        return {'low': None, 'high': None, 'n_resamples': 0}
+    rng = np.random.default_rng(seed)
+    diffs = bootstrap_means(a, n_resamples, rng) - bootstrap_means(b, n_resamples, rng)
+    low, high = np.quantile(diffs, [alpha / 2, 1 - alpha / 2])
+    return {'low': float(low), 'high': float(high), 'n_resamples': n_resamples}
+
+
+def compare(a, b, n_resamples=10000, alpha=0.05, seed=None):
+    """Full comparison of treatment values a against control values b"""
+    a, b = np.asarray(a, dtype=float), np.asarray(b, dtype=float)
+    result = {
+        'n_treatment': len(a),
+        'n_control': len(b),
+        'mean_treatment': float(a.mean()) if len(a) else None,
+        'mean_control': float(b.mean()) if len(b) else None,
+        'difference': float(a.mean() - b.mean()) if len(a) and len(b) else None,
+    }
+    result.update(welch_t_test(a, b))
+    result.update(effect_size(a, b))
+    result['bootstrap_ci'] = bootstrap_diff_ci(a, b, n_resamples, alpha, seed)
+    return result
+
+
+def usia_band(usia):
+    usia = np.asarray([-1 if u is None else u for u in usia], dtype=float)
+    labels = np.asarray(USIA_BAND_LABELS, dtype=object)[np.digitize(usia, USIA_BANDS)]
+    labels[usia < 0] = None
+    return labels
+
+
+def load_outcomes(conn):
+    """Column arrays of improvement, kelompok and segment values per user"""
+    rows = conn.execute('''SELECT uo.kelompok, uo.posttest - uo.pretest AS improvement,
+                                  up.pendidikan, up.lokasi, up.usia, up.level_rekomendasi
+                           FROM user_outcomes uo
+                           LEFT JOIN user_profiles up ON up.user_id = uo.user_id
+                           WHERE uo.pretest IS NOT NULL AND uo.posttest IS NOT NULL''').fetchall()
+    columns = list(zip(*rows)) if rows else [()] * 6
+    return {
+        'kelompok': np.asarray(columns[0], dtype=object),
+        'improvement': np.asarray(columns[1], dtype=float),
+        'pendidikan': np.asarray(columns[2], dtype=object),
+        'lokasi': np.asarray(columns[3], dtype=object),
+        'usia_band': usia_band(columns[4]),
+        'level_rekomendasi': np.asarray(columns[5], dtype=object),
+    }
+
+
+def analyze(data, baseline='control', n_resamples=10000, alpha=0.05, seed=0):
+    """Overall and per-segment comparisons of every arm against the baseline arm"""
+    kelompok = data['kelompok']
+    improvement = data['improvement']
+    control_mask = kelompok == baseline
+    # The holdout is a global control for long-term effects, not a treatment arm
+    arms = sorted(k for k in set(kelompok.tolist()) if k not in (baseline, HOLDOUT_ARM))
+
+    report = {'baseline': baseline, 'alpha': alpha, 'arms': {}}
+    for arm in arms:
+        arm_mask = kelompok == arm
+        arm_report = {
+            'overall': compare(improvement[arm_mask], improvement[control_mask], n_resamples, alpha, seed),
+            'segments': {},
+        }
+        for column in SEGMENT_COLUMNS:
+            values = data[column]
+            segments = {}
+            for value in sorted({v for v in values.tolist() if v is not None}, key=str):
+                in_segment = values == value
+                segments[str(value)] = compare(improvement[arm_mask & in_segment],
+                                               improvement[control_mask & in_segment],
+                                               n_resamples, alpha, seed)
+            arm_report['segments'][column] = segments
+        report['arms'][arm] = arm_report
+    return report
+
+
+class StatsCache:
+    """Keeps the last report until new pretest/posttest rows arrive"""
+
+    def __init__(self, n_resamples=10000, alpha=0.05, baseline='control'):
+        self.n_resamples = n_resamples
+        self.baseline = baseline
+        self.alpha = alpha
+        self._lock = threading.Lock()
+        self._key = None
+        self._report = None
+
+    @staticmethod
+    def data_version(conn):
+        # AUTOINCREMENT ids only grow, so the max ids change exactly when rows are added
+        return tuple(conn.execute('''SELECT (SELECT COALESCE(MAX(id), 0) FROM posttest_results),
+                                            (SELECT COALESCE(MAX(id), 0) FROM pretest_results)''').fetchone())
+
+    def get(self, conn):
+        key = self.data_version(conn)
+        with self._lock:
+            if key == self._key:
+                return self._report
+        report = analyze(load_outcomes(conn), baseline=self.baseline, n_resamples=self.n_resamples, alpha=self.alpha)
+        report['data_version'] = {'posttest_id': key[0], 'pretest_id': key[1]}
+        with self._lock:
+            self._key, self._report = key, report
+        return report
@@ -0,0 +1,98 @@
+"""Batched, off-request-path logging of experiment exposures.
+
+Requests only append to a bounded in-memory queue; a daemon thread drains it
+and inserts into experiment_exposures with one executemany per batch. When
+the queue is full (the database is stalled), new events are dropped and
+counted rather than blocking the request.
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+from datetime import datetime
+
+import db
+
+logger = logging.getLogger(__name__)
+
+
+class ExposureLogger:
+    def __init__(self, pool, batch_size=500, flush_interval=1.0, max_queue=100000):
+        self.pool = pool
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._counts = {'logged': 0, 'written': 0, 'dropped': 0, 'batches': 0, 'errors': 0}
+        self._thread = threading.Thread(target=self._run, name='exposure-flusher', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def log(self, user_id, assignments, page):
+        """Queue one exposure per (experiment, arm) in assignments - never blocks"""
+        now = datetime.now().isoformat(sep=' ', timespec='seconds')
+        for experiment, arm in assignments.items():
+            try:
+                self._queue.put_nowait((experiment, arm, user_id, page, now))
+                self._count('logged')
+            except queue.Full:
+                self._count('dropped')
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self._counts[name] += amount
+
+    def _drain(self):
+        batch = []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def flush(self):
+        """Write everything queued so far; returns the number of rows written"""
+        written = 0
+        while True:
+            batch = self._drain()
+            if not batch:
+                return written
+            try:
+                conn = self.pool.acquire()
+                try:
+                    db.run_write(conn, lambda c: c.executemany(
+                        '''INSERT INTO experiment_exposures (experiment, arm, user_id, page, exposed_at)
+                           VALUES (?, ?, ?, ?, ?)''', batch), self.pool.storage)
+                finally:
+                    # Hand the connection back between batches so requests can use it
+                    self.pool.release()
+            except Exception:
+                logger.exception("Exposure flush error")
+                self._count('errors')
+                self._count('dropped', len(batch))
+                return written
+            written += len(batch)
+            self._count('written', len(batch))
+            self._count('batches')
+
+    def _run(self):
+        while not self._stop.is_set():
+            start = time.monotonic()
+            self.flush()
+            self._stop.wait(max(0.0, self.flush_interval - (time.monotonic() - start)))
+
+    def close(self):
+        self._stop.set()
+        self._thread.join(timeout=5)
+        self.flush()
+
+    def stats(self):
+        with self._lock:
+            counts = dict(self._counts)
+        counts['queued'] = self._queue.qsize()
+        counts['batch_size'] = self.batch_size
+        counts['flush_interval_seconds'] = self.flush_interval
+        return counts
@@ -0,0 +1,90 @@
+"""Incremental training-data extraction into an on-disk feature store.
+
+The store is a separate SQLite file holding one training row per user (their
+profile joined with their latest pretest) plus two high-water marks: the
+highest user_profiles.change_seq and pretest_results.id already copied. Each
+sync only reads users touched since then, streaming them in chunks.
+"""
+import os
+import sqlite3
+
+import pandas as pd
+
+import db
+from model import FEATURE_COLUMNS
+
+
+STORE_COLUMNS = FEATURE_COLUMNS + ['level_rekomendasi']
+TEXT_COLUMNS = {'jenis_kelamin', 'lokasi', 'pendidikan', 'level_rekomendasi'}
+
+CHANGED_ROWS_QUERY = '''
+WITH changed(user_id) AS (
+    SELECT user_id FROM user_profiles WHERE change_seq > :last_seq AND change_seq <= :max_seq
+    UNION
+    SELECT user_id FROM pretest_results WHERE id > :last_pretest AND id <= :max_pretest
+)
+SELECT up.user_id,
+       up.usia, up.jenis_kelamin, up.lokasi, up.pendidikan, up.pengalaman,
+       pr.score AS skor_pretest,
+       up.minat_1, up.minat_2, up.minat_3, up.minat_4, up.minat_5,
+       up.level_rekomendasi
+FROM changed ch
+JOIN user_profiles up ON up.user_id = ch.user_id
+JOIN pretest_results pr
+  ON pr.id = (SELECT MAX(id) FROM pretest_results WHERE user_id = up.user_id AND id <= :max_pretest)
+WHERE up.level_rekomendasi IS NOT NULL
+'''
+
+
+class FeatureStore:
+    def __init__(self, path=None):
+        self.path = path or os.environ.get('FEATURE_STORE_PATH', 'feature_store.db')
+        self.conn = sqlite3.connect(self.path, check_same_thread=False)
+        db.StorageConfig.from_env().apply(self.conn)
+        columns = ', '.join(f'{col} {"TEXT" if col in TEXT_COLUMNS else "INTEGER"}' for col in STORE_COLUMNS)
+        self.conn.execute(f'CREATE TABLE IF NOT EXISTS training_features (user_id INTEGER PRIMARY KEY, {columns})')
+        self.conn.execute('CREATE TABLE IF NOT EXISTS store_meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+        self.conn.commit()
+
+    def high_water_marks(self):
+        marks = dict(self.conn.execute('SELECT key, value FROM store_meta').fetchall())
+        return marks.get('profile_change_seq', 0), marks.get('pretest_id', 0)
+
+    def sync(self, source, chunk_size=10000):
+        """Copy users changed since the last sync; returns the number of rows upserted"""
+        last_seq, last_pretest = self.high_water_marks()
+        # Fix the upper bounds first so rows written during the sync are picked up next time
+        max_seq = source.execute('SELECT COALESCE(MAX(change_seq), 0) FROM user_profiles').fetchone()[0]
+        max_pretest = source.execute('SELECT COALESCE(MAX(id), 0) FROM pretest_results').fetchone()[0]
+        if max_seq <= last_seq and max_pretest <= last_pretest:
+            return 0
+
+        placeholders = ', '.join('?' for _ in range(len(STORE_COLUMNS) + 1))
+        upsert = f'INSERT OR REPLACE INTO training_features (user_id, {", ".join(STORE_COLUMNS)}) VALUES ({placeholders})'
+        params = {
+            'last_seq': last_seq, 'max_seq': max_seq,
+            'last_pretest': last_pretest, 'max_pretest': max_pretest,
+        }
+
+        def work(c):
+            # Re-read the source on every attempt: a busy retry must not resume a half-consumed cursor
+            cursor = source.execute(CHANGED_ROWS_QUERY, params)
+            copied = 0
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                c.executemany(upsert, [tuple(row) for row in rows])
+                copied += len(rows)
+            c.executemany('INSERT OR REPLACE INTO store_meta (key, value) VALUES (?, ?)',
+                          [('profile_change_seq', max_seq), ('pretest_id', max_pretest)])
+            return copied
+
+        return db.run_write(self.conn, work)
+
+    def load_frame(self):
+        """All stored training rows as a DataFrame in FEATURE_COLUMNS order"""
+        return pd.read_sql_query(f'SELECT {", ".join(STORE_COLUMNS)} FROM training_features', self.conn)
+
+    def close(self):
+        self.conn.close()
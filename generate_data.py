@@ -0,0 +1,110 @@
+"""Stream large synthetic cohorts for model experiments and load tests.
+
+    python generate_data.py --rows 10000000 --format csv --output cohort.csv
+    python generate_data.py --rows 10000000 --format parquet --output cohort.parquet
+    python generate_data.py --rows 1000000 --format sqlite --output database.db
+
+Rows are generated chunk by chunk with vectorized labeling, so memory stays
+bounded by --chunk-size. The sqlite target fills users, user_profiles and
+pretest_results the same way the app's register/profile/pretest routes do.
+"""
+import argparse
+import json
+import sqlite3
+import time
+
+import numpy as np
+
+import assignment
+import db
+import migrations
+from model import iter_sample_data
+
+
+def write_csv(chunks, path):
+    total = 0
+    for i, chunk in enumerate(chunks):
+        chunk.to_csv(path, mode='w' if i == 0 else 'a', header=(i == 0), index=False)
+        total += len(chunk)
+    return total
+
+
+def write_parquet(chunks, path):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise SystemExit("Parquet output needs pyarrow (pip install pyarrow)")
+
+    writer = None
+    total = 0
+    try:
+        for chunk in chunks:
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table)
+            total += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    return total
+
+
+def write_sqlite(chunks, path):
+    conn = sqlite3.connect(path)
+    storage = db.StorageConfig.from_env()
+    storage.apply(conn)
+    migrations.migrate(conn, storage=storage)
+
+    experiment = assignment.load_experiment()
+    start_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM users').fetchone()[0]
+    answers = json.dumps({q: '0' for q in ['q1', 'q2', 'q3', 'q4', 'q5']})
+    profile_columns = ['usia', 'jenis_kelamin', 'pendidikan', 'pengalaman', 'minat_1', 'minat_2',
+                       'minat_3', 'minat_4', 'minat_5', 'lokasi', 'skor_pretest']
+    total = 0
+
+    for chunk in chunks:
+        n = len(chunk)
+        ids = np.arange(start_id + total + 1, start_id + total + n + 1)
+        # Same hash-based assignment as /register
+        kelompok = [experiment.assign(f'load_{i}') for i in ids]
+        # Series.tolist() yields Python scalars, which sqlite3 can bind; a list so retries can replay it
+        profiles = list(zip(*(chunk[col].tolist() for col in profile_columns)))
+
+        def work(c):
+            c.executemany('INSERT INTO users (id, username, password, email, kelompok) VALUES (?, ?, ?, ?, ?)',
+                          ((int(i), f'load_{i}', 'load', None, str(k)) for i, k in zip(ids, kelompok)))
+            c.executemany(f'''INSERT INTO user_profiles (user_id, {', '.join(profile_columns)})
+                              VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+                          ((int(i),) + row for i, row in zip(ids, profiles)))
+            c.executemany('INSERT INTO pretest_results (user_id, answers, score) VALUES (?, ?, ?)',
+                          ((int(i), answers, int(s)) for i, s in zip(ids, chunk['skor_pretest'])))
+
+        db.run_write(conn, work, storage)
+        total += n
+
+    conn.close()
+    return total
+
+
+WRITERS = {
+    'csv': write_csv,
+    'parquet': write_parquet,
+    'sqlite': write_sqlite,
+}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Generate synthetic cohorts in chunks')
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--chunk-size', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--format', choices=sorted(WRITERS), default='csv')
+    parser.add_argument('--output', required=True)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    chunks = iter_sample_data(args.rows, args.chunk_size, args.seed)
+    total = WRITERS[args.format](chunks, args.output)
+    print(f"Wrote {total} rows to {args.output} in {time.perf_counter() - start:.1f}s")
@@ -0,0 +1,313 @@
+"""Request, database, inference and template instrumentation.
+
+Metrics live in a process-wide Registry and are rendered in the Prometheus
+text exposition format (no client library needed):
+
+    http_request_duration_seconds{method,endpoint,status}   histogram
+    http_request_db_queries{endpoint}                        histogram
+    db_query_duration_seconds{operation}                     histogram
+    model_inference_seconds{variant}                         histogram
+    template_render_seconds{template}                        histogram
+
+DB timings come from InstrumentedConnection, a sqlite3.Connection factory
+used by the pool. The opt-in SlowRequestProfiler samples the stacks of
+in-flight requests on a background thread and writes the samples of requests
+slower than a threshold as folded stacks (flamegraph.pl / speedscope input).
+"""
+import bisect
+import collections
+import logging
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from datetime import datetime
+
+from flask import before_render_template, g, has_request_context, request, template_rendered
+
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in list(zip(names, values)) + list(extra)]
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Histogram:
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        # label values -> [per-bucket counts (+Inf last), sum]
+        self._series = {}
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = {labels: (list(counts), total) for labels, (counts, total) in self._series.items()}
+        for labels, (counts, total) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{_labels(self.labelnames, labels, [("le", bound)])} {cumulative}')
+            lines.append(f'{self.name}_sum{_labels(self.labelnames, labels)} {total}')
+            lines.append(f'{self.name}_count{_labels(self.labelnames, labels)} {cumulative}')
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = collections.Counter()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] += amount
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        with self._lock:
+            values = dict(self._values)
+        lines.extend(f'{self.name}{_labels(self.labelnames, labels)} {value}'
+                     for labels, value in sorted(values.items()))
+        return lines
+
+
+class Gauge:
+    """Value read from a callback at scrape time; fn returns a number or {label values: number}"""
+
+    def __init__(self, name, help_text, fn, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.fn = fn
+        self.labelnames = tuple(labelnames)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} gauge']
+        values = self.fn()
+        if not isinstance(values, dict):
+            values = {(): values}
+        lines.extend(f'{self.name}{_labels(self.labelnames, labels)} {float(value or 0)}'
+                     for labels, value in sorted(values.items()))
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def histogram(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name, help_text, fn, labelnames=()):
+        return self._register(Gauge(name, help_text, fn, labelnames))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                lines.append(f'# {metric.name} unavailable: {_escape(e)}')
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = Registry()
+
+REQUEST_SECONDS = REGISTRY.histogram('http_request_duration_seconds', 'Request latency',
+                                     ('method', 'endpoint', 'status'))
+REQUEST_QUERIES = REGISTRY.histogram('http_request_db_queries', 'Database queries per request',
+                                     ('endpoint',), QUERY_COUNT_BUCKETS)
+REQUEST_EXCEPTIONS = REGISTRY.counter('http_request_exceptions_total', 'Unhandled request exceptions',
+                                      ('endpoint',))
+QUERY_SECONDS = REGISTRY.histogram('db_query_duration_seconds', 'SQLite statement execution time',
+                                   ('operation',))
+INFERENCE_SECONDS = REGISTRY.histogram('model_inference_seconds', 'Uncached recommendation inference time',
+                                       ('variant',))
+TEMPLATE_SECONDS = REGISTRY.histogram('template_render_seconds', 'Jinja template render time',
+                                      ('template',))
+
+
+def observe_query(sql, seconds):
+    operation = sql.lstrip().split(None, 1)[0].upper() if sql.strip() else 'UNKNOWN'
+    QUERY_SECONDS.observe(seconds, operation)
+    if has_request_context():
+        g.instrument_db_queries = g.get('instrument_db_queries', 0) + 1
+        g.instrument_db_seconds = g.get('instrument_db_seconds', 0.0) + seconds
+
+
+def observe_inference(variant, seconds):
+    INFERENCE_SECONDS.observe(seconds, variant)
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """sqlite3 connection that times every execute/executemany/executescript"""
+
+    def execute(self, sql, parameters=(), /):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            observe_query(sql, time.perf_counter() - start)
+
+    def executemany(self, sql, parameters, /):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, parameters)
+        finally:
+            observe_query(sql, time.perf_counter() - start)
+
+    def executescript(self, sql_script, /):
+        start = time.perf_counter()
+        try:
+            return super().executescript(sql_script)
+        finally:
+            observe_query(sql_script, time.perf_counter() - start)
+
+
+class SlowRequestProfiler:
+    """Samples in-flight request stacks; keeps the samples of slow requests as folded stacks"""
+
+    def __init__(self, threshold_ms, interval_ms=5.0, output_dir='profiles', max_files=200):
+        self.threshold = threshold_ms / 1000.0
+        self.interval = interval_ms / 1000.0
+        self.output_dir = output_dir
+        self.max_files = max_files
+        self.written = 0
+        self._active = {}
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name='request-profiler', daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def from_env(cls, environ=None):
+        """Profiler when PROFILE_SLOW_REQUEST_MS is set, otherwise None"""
+        env = os.environ if environ is None else environ
+        threshold = float(env.get('PROFILE_SLOW_REQUEST_MS', 0))
+        if threshold <= 0:
+            return None
+        return cls(threshold,
+                   interval_ms=float(env.get('PROFILE_SAMPLE_INTERVAL_MS', 5)),
+                   output_dir=env.get('PROFILE_DIR', 'profiles'))
+
+    @staticmethod
+    def fold(frame):
+        stack = []
+        while frame is not None:
+            code = frame.f_code
+            stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+            frame = frame.f_back
+        return ';'.join(reversed(stack))
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                if not self._active:
+                    continue
+                frames = sys._current_frames()
+                for ident, samples in self._active.items():
+                    frame = frames.get(ident)
+                    if frame is not None:
+                        samples[self.fold(frame)] += 1
+
+    def begin(self):
+        with self._lock:
+            self._active[threading.get_ident()] = collections.Counter()
+
+    def end(self, name, seconds):
+        with self._lock:
+            samples = self._active.pop(threading.get_ident(), None)
+        if not samples or seconds < self.threshold or self.written >= self.max_files:
+            return None
+        os.makedirs(self.output_dir, exist_ok=True)
+        safe_name = re.sub(r'[^A-Za-z0-9_.-]+', '_', name).strip('_') or 'request'
+        path = os.path.join(self.output_dir,
+                            f"{datetime.now():%Y%m%d-%H%M%S-%f}-{int(seconds * 1000)}ms-{safe_name}.folded")
+        with open(path, 'w') as f:
+            f.writelines(f'{stack} {count}\n' for stack, count in samples.items())
+        self.written += 1
+        return path
+
+
+def init_app(app, profiler=None):
+    """Time every request and template render of app; optionally profile slow requests"""
+
+    @app.before_request
+    def start_request_timer():
+        g.instrument_start = time.perf_counter()
+        # Query counters are not reset here: a server-side session was already read while opening it
+        if profiler is not None:
+            profiler.begin()
+
+    @app.after_request
+    def record_status(response):
+        g.instrument_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def record_request(exception=None):
+        start = g.pop('instrument_start', None)
+        if start is None:
+            return
+        elapsed = time.perf_counter() - start
+        # The rule, not the path, so /admin/train_model/<job_id> stays one series
+        endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        status = 500 if exception is not None else g.get('instrument_status', 500)
+        REQUEST_SECONDS.observe(elapsed, request.method, endpoint, str(status))
+        REQUEST_QUERIES.observe(g.get('instrument_db_queries', 0), endpoint)
+        if exception is not None:
+            REQUEST_EXCEPTIONS.inc(endpoint)
+        if profiler is not None:
+            path = profiler.end(f'{request.method}-{endpoint}', elapsed)
+            if path:
+                logger.warning("Slow request profiled",
+                               extra={'data': {'method': request.method, 'path': request.path,
+                                               'duration_ms': round(elapsed * 1000, 1), 'profile': path}})
+
+    def start_template_timer(sender, template, context, **extra):
+        g.instrument_template_start = time.perf_counter()
+
+    def record_template(sender, template, context, **extra):
+        start = g.pop('instrument_template_start', None)
+        if start is not None:
+            TEMPLATE_SECONDS.observe(time.perf_counter() - start, template.name or 'string')
+
+    before_render_template.connect(start_template_timer, app, weak=False)
+    template_rendered.connect(record_template, app, weak=False)
+    app.extensions['instrumentation'] = REGISTRY
+    return REGISTRY
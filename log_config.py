@@ -0,0 +1,144 @@
+"""Structured JSON logging that keeps I/O off the request thread.
+
+configure() routes the root logger through a bounded QueueHandler; a
+QueueListener thread formats each record as one JSON line and writes it.
+Records are stamped with the current request id before they are queued, and
+a record logged with extra={'sample_rate': r} is kept with probability r, so
+per-prediction events cost a random() call when they are dropped.
+
+    logger.info('prediction', extra={'data': {'label': label}, 'sample_rate': 0.01})
+
+LOG_LEVEL sets the level (default INFO) and LOG_QUEUE_SIZE bounds the queue;
+when it is full records are dropped and counted instead of blocking.
+"""
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import uuid
+from datetime import datetime, timezone
+
+from flask import g, has_request_context, request
+
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+
+_listener = None
+_handler = None
+_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'thread': record.threadName,
+        }
+        request_id = getattr(record, 'request_id', None)
+        if request_id:
+            entry['request_id'] = request_id
+        if getattr(record, 'sample_rate', 1.0) < 1.0:
+            entry['sample_rate'] = record.sample_rate
+        data = getattr(record, 'data', None)
+        if data:
+            entry.update(data)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class ContextFilter(logging.Filter):
+    """Applies per-record sampling and stamps the request id before the record is queued"""
+
+    def filter(self, record):
+        rate = getattr(record, 'sample_rate', 1.0)
+        if rate < 1.0 and random.random() >= rate:
+            return False
+        if not hasattr(record, 'request_id'):
+            record.request_id = g.get('request_id') if has_request_context() else None
+        return True
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that never blocks: a full queue drops (and counts) the record"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Resolve the message and traceback now, but keep them separate for the JSON formatter
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+def configure(level=None, stream=None, queue_size=None):
+    """Install the queued JSON handler on the root logger (idempotent)"""
+    global _listener, _handler
+    with _lock:
+        if _listener is not None:
+            return _handler
+        log_queue = queue.Queue(maxsize=int(queue_size or os.environ.get('LOG_QUEUE_SIZE', 10000)))
+        output = logging.StreamHandler(stream or sys.stdout)
+        output.setFormatter(JsonFormatter())
+
+        _handler = DroppingQueueHandler(log_queue)
+        _handler.addFilter(ContextFilter())
+        root = logging.getLogger()
+        root.handlers = [_handler]
+        root.setLevel(level or os.environ.get('LOG_LEVEL', 'INFO').upper())
+
+        _listener = logging.handlers.QueueListener(log_queue, output, respect_handler_level=True)
+        _listener.start()
+        atexit.register(shutdown)
+        return _handler
+
+
+def shutdown():
+    """Flush queued records and stop the listener thread"""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+def stats():
+    return {
+        'queued': _handler.queue.qsize() if _handler else 0,
+        'dropped': _handler.dropped if _handler else 0,
+    }
+
+
+def init_app(app):
+    """Give every request an id (taken from X-Request-ID when present) and echo it back"""
+
+    @app.before_request
+    def assign_request_id():
+        g.request_id = request.headers.get(REQUEST_ID_HEADER, '')[:64] or uuid.uuid4().hex
+
+    @app.after_request
+    def echo_request_id(response):
+        if 'request_id' in g:
+            response.headers[REQUEST_ID_HEADER] = g.request_id
+        return response
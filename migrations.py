@@ -0,0 +1,297 @@
+"""Versioned schema migrations for database.db.
+
+Each migration is (version, name, statements). Applied versions are recorded
+in the schema_migrations table and mirrored in PRAGMA user_version, so
+app setup only runs what a given database has not seen yet.
+
+    python migrations.py            # migrate DATABASE_PATH (default database.db)
+"""
+import logging
+import os
+import sqlite3
+
+import db
+import log_config
+
+logger = logging.getLogger(__name__)
+
+
+# Rollup metric -> expression over user_outcomes
+ROLLUP_METRICS = {
+    'pretest': 'pretest',
+    'posttest': 'posttest',
+    'improvement': 'posttest - pretest',
+}
+
+
+def _rollup_trigger(test):
+    """AFTER INSERT trigger keeping user_outcomes and kelompok_rollups in step with {test}_results.
+
+    The user's previous contribution to each affected metric is retracted,
+    their outcome row updated, and the new contribution added - O(1) per insert.
+    """
+    affected = {metric: value for metric, value in ROLLUP_METRICS.items() if metric in (test, 'improvement')}
+    retract = [f"""UPDATE kelompok_rollups
+                   SET n = n - 1,
+                       total = total - (SELECT {value} FROM user_outcomes WHERE user_id = NEW.user_id),
+                       total_sq = total_sq - (SELECT ({value}) * ({value}) FROM user_outcomes WHERE user_id = NEW.user_id)
+                   WHERE metric = '{metric}'
+                     AND kelompok = (SELECT kelompok FROM user_outcomes WHERE user_id = NEW.user_id)
+                     AND (SELECT {value} FROM user_outcomes WHERE user_id = NEW.user_id) IS NOT NULL;"""
+               for metric, value in affected.items()]
+    upsert = f"""INSERT INTO user_outcomes (user_id, kelompok, {test}, updated_at)
+                 VALUES (NEW.user_id,
+                         COALESCE((SELECT kelompok FROM users WHERE id = NEW.user_id), 'control'),
+                         NEW.score, NEW.created_at)
+                 ON CONFLICT(user_id) DO UPDATE SET {test} = excluded.{test}, updated_at = excluded.updated_at;"""
+    add = [f"""INSERT INTO kelompok_rollups (kelompok, metric, n, total, total_sq)
+               SELECT kelompok, '{metric}', 1, {value}, ({value}) * ({value})
+               FROM user_outcomes WHERE user_id = NEW.user_id AND ({value}) IS NOT NULL
+               ON CONFLICT(kelompok, metric) DO UPDATE SET
+                   n = n + 1, total = total + excluded.total, total_sq = total_sq + excluded.total_sq;"""
+           for metric, value in affected.items()]
+    body = '\n'.join(retract + [upsert] + add)
+    return f"""CREATE TRIGGER IF NOT EXISTS trg_{test}_results_rollup
+               AFTER INSERT ON {test}_results
+               BEGIN
+               {body}
+               END"""
+
+
+# Welford moments (n, mean, M2) of first-posttest improvement per kelompok, matching
+# sequential.record_observation: each user's first posttest minus the pretest they had then
+SEED_SEQUENTIAL_MOMENTS = '''
+WITH first_posttest AS (
+    SELECT p.user_id, p.score, p.created_at
+    FROM posttest_results p
+    WHERE p.id = (SELECT MIN(id) FROM posttest_results WHERE user_id = p.user_id)
+),
+observations AS (
+    SELECT o.kelompok,
+           fp.score - (SELECT pr.score FROM pretest_results pr
+                       WHERE pr.user_id = fp.user_id AND pr.created_at <= fp.created_at
+                       ORDER BY pr.created_at DESC, pr.id DESC LIMIT 1) AS improvement
+    FROM first_posttest fp
+    JOIN user_outcomes o ON o.user_id = fp.user_id
+)
+INSERT OR REPLACE INTO sequential_moments (kelompok, n, mean, m2)
+SELECT kelompok, COUNT(improvement), AVG(improvement),
+       SUM(improvement * improvement) - CAST(SUM(improvement) AS REAL) * SUM(improvement) / COUNT(improvement)
+FROM observations
+WHERE improvement IS NOT NULL
+GROUP BY kelompok
+'''
+
+MIGRATIONS = [
+    (1, 'initial schema', [
+        '''CREATE TABLE IF NOT EXISTS users
+           (id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL,
+            email TEXT,
+            kelompok TEXT DEFAULT 'control',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''',
+        '''CREATE TABLE IF NOT EXISTS pretest_results
+           (id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            answers TEXT NOT NULL,
+            score INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id))''',
+        '''CREATE TABLE IF NOT EXISTS posttest_results
+           (id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            answers TEXT NOT NULL,
+            score INTEGER NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id))''',
+        '''CREATE TABLE IF NOT EXISTS user_profiles
+           (id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            usia INTEGER,
+            jenis_kelamin TEXT,
+            pendidikan TEXT,
+            pengalaman INTEGER,
+            minat_1 INTEGER,
+            minat_2 INTEGER,
+            minat_3 INTEGER,
+            minat_4 INTEGER,
+            minat_5 INTEGER,
+            lokasi TEXT,
+            skor_pretest INTEGER,
+            level_rekomendasi TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id))''',
+    ]),
+    (2, 'user_id lookup indexes', [
+        # Keep only the newest profile per user before enforcing uniqueness
+        '''DELETE FROM user_profiles
+           WHERE id NOT IN (SELECT MAX(id) FROM user_profiles GROUP BY user_id)''',
+        'CREATE UNIQUE INDEX IF NOT EXISTS idx_user_profiles_user_id ON user_profiles (user_id)',
+        '''CREATE INDEX IF NOT EXISTS idx_pretest_results_user_created
+           ON pretest_results (user_id, created_at DESC)''',
+        '''CREATE INDEX IF NOT EXISTS idx_posttest_results_user_created
+           ON posttest_results (user_id, created_at DESC)''',
+    ]),
+    (3, 'user_profiles change sequence', [
+        # Monotonic per-row change counter, used as the feature store high-water mark
+        'ALTER TABLE user_profiles ADD COLUMN change_seq INTEGER NOT NULL DEFAULT 0',
+        'UPDATE user_profiles SET change_seq = id',
+        'CREATE INDEX IF NOT EXISTS idx_user_profiles_change_seq ON user_profiles (change_seq)',
+        '''CREATE TRIGGER IF NOT EXISTS trg_user_profiles_insert_seq
+           AFTER INSERT ON user_profiles
+           BEGIN
+               UPDATE user_profiles SET change_seq = (SELECT MAX(change_seq) FROM user_profiles) + 1
+               WHERE id = NEW.id;
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_user_profiles_update_seq
+           AFTER UPDATE OF usia, jenis_kelamin, pendidikan, pengalaman, minat_1, minat_2, minat_3,
+                           minat_4, minat_5, lokasi, skor_pretest, level_rekomendasi ON user_profiles
+           BEGIN
+               UPDATE user_profiles SET change_seq = (SELECT MAX(change_seq) FROM user_profiles) + 1
+               WHERE id = NEW.id;
+           END''',
+    ]),
+    (4, 'kelompok outcome rollups', [
+        # Latest pretest/posttest per user, so retakes replace rather than fan out
+        '''CREATE TABLE IF NOT EXISTS user_outcomes
+           (user_id INTEGER PRIMARY KEY,
+            kelompok TEXT NOT NULL,
+            pretest INTEGER,
+            posttest INTEGER,
+            updated_at TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (id))''',
+        # count, sum and sum of squares per (kelompok, metric)
+        '''CREATE TABLE IF NOT EXISTS kelompok_rollups
+           (kelompok TEXT NOT NULL,
+            metric TEXT NOT NULL,
+            n INTEGER NOT NULL DEFAULT 0,
+            total INTEGER NOT NULL DEFAULT 0,
+            total_sq INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (kelompok, metric))''',
+        '''INSERT OR REPLACE INTO user_outcomes (user_id, kelompok, pretest, posttest, updated_at)
+           SELECT u.id, COALESCE(u.kelompok, 'control'),
+                  (SELECT score FROM pretest_results WHERE id =
+                      (SELECT MAX(id) FROM pretest_results WHERE user_id = u.id)),
+                  (SELECT score FROM posttest_results WHERE id =
+                      (SELECT MAX(id) FROM posttest_results WHERE user_id = u.id)),
+                  COALESCE((SELECT MAX(created_at) FROM posttest_results WHERE user_id = u.id),
+                           (SELECT MAX(created_at) FROM pretest_results WHERE user_id = u.id))
+           FROM users u
+           WHERE EXISTS (SELECT 1 FROM pretest_results WHERE user_id = u.id)
+              OR EXISTS (SELECT 1 FROM posttest_results WHERE user_id = u.id)''',
+        'DELETE FROM kelompok_rollups',
+        *[f'''INSERT INTO kelompok_rollups (kelompok, metric, n, total, total_sq)
+              SELECT kelompok, '{metric}', COUNT({value}), COALESCE(SUM({value}), 0),
+                     COALESCE(SUM(({value}) * ({value})), 0)
+              FROM user_outcomes GROUP BY kelompok'''
+          for metric, value in ROLLUP_METRICS.items()],
+        _rollup_trigger('pretest'),
+        _rollup_trigger('posttest'),
+    ]),
+    (5, 'sequential monitoring moments', [
+        # Welford running moments of first-posttest improvement per kelompok
+        '''CREATE TABLE IF NOT EXISTS sequential_moments
+           (kelompok TEXT PRIMARY KEY,
+            n INTEGER NOT NULL,
+            mean REAL NOT NULL,
+            m2 REAL NOT NULL)''',
+        # Running minimum of the always-valid p-value per arm
+        '''CREATE TABLE IF NOT EXISTS sequential_monitor
+           (arm TEXT PRIMARY KEY,
+            p_value REAL NOT NULL,
+            updated_at TIMESTAMP)''',
+        # Seed from existing outcomes; later observations are added as posttests arrive
+        SEED_SEQUENTIAL_MOMENTS,
+    ]),
+    (6, 'experiment exposure log', [
+        # One row per (experiment, arm) a user was shown, written in batches
+        '''CREATE TABLE IF NOT EXISTS experiment_exposures
+           (id INTEGER PRIMARY KEY AUTOINCREMENT,
+            experiment TEXT NOT NULL,
+            arm TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            page TEXT NOT NULL,
+            exposed_at TIMESTAMP NOT NULL,
+            FOREIGN KEY (user_id) REFERENCES users (id))''',
+        '''CREATE INDEX IF NOT EXISTS idx_experiment_exposures_experiment_arm
+           ON experiment_exposures (experiment, arm)''',
+        '''CREATE INDEX IF NOT EXISTS idx_experiment_exposures_user
+           ON experiment_exposures (user_id, experiment)''',
+    ]),
+    (7, 'server-side sessions', [
+        # Session data (SESSION_BACKEND=sqlite) and funnel state generations
+        '''CREATE TABLE IF NOT EXISTS server_sessions
+           (key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            expires_at REAL NOT NULL)''',
+        '''CREATE INDEX IF NOT EXISTS idx_server_sessions_expires
+           ON server_sessions (expires_at)''',
+    ]),
+    (8, 'reseed sequential moments from first posttests', [
+        # Version 5 seeded from latest-posttest rollups; live updates only count a user's first posttest
+        'DELETE FROM sequential_moments',
+        SEED_SEQUENTIAL_MOMENTS,
+    ]),
+]
+
+
+def _ensure_version_table(conn):
+    conn.execute('''CREATE TABLE IF NOT EXISTS schema_migrations
+                    (version INTEGER PRIMARY KEY,
+                     name TEXT NOT NULL,
+                     applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+    conn.commit()
+
+
+def current_version(conn):
+    """Highest applied migration version (0 for a fresh database)"""
+    _ensure_version_table(conn)
+    row = conn.execute('SELECT MAX(version) FROM schema_migrations').fetchone()
+    return row[0] or 0
+
+
+def applied_versions(conn):
+    _ensure_version_table(conn)
+    return {row[0] for row in conn.execute('SELECT version FROM schema_migrations')}
+
+
+def migrate(conn, target=None, storage=None):
+    """Apply pending migrations in order, each in its own transaction
+
+    Pending means not recorded in schema_migrations, not above the highest
+    version: a migration that failed is retried even if a later one succeeded.
+    """
+    applied = []
+    done = applied_versions(conn)
+
+    for number, name, statements in MIGRATIONS:
+        if number in done or (target is not None and number > target):
+            continue
+
+        def apply(c, number=number, name=name, statements=statements):
+            # Re-checked under the write lock: another worker may have applied it since we read the version
+            if c.execute('SELECT 1 FROM schema_migrations WHERE version = ?', (number,)).fetchone():
+                return False
+            for sql in statements:
+                c.execute(sql)
+            c.execute('INSERT INTO schema_migrations (version, name) VALUES (?, ?)', (number, name))
+            # Never lowered: a retried older migration can be applied after a newer one
+            c.execute(f"PRAGMA user_version = {int(c.execute('SELECT MAX(version) FROM schema_migrations').fetchone()[0])}")
+            return True
+
+        if not db.run_write(conn, apply, storage):
+            continue
+        applied.append((number, name))
+        logger.info("Applied migration %d: %s", number, name)
+
+    return applied
+
+
+if __name__ == '__main__':
+    log_config.configure()
+    database = os.environ.get('DATABASE_PATH', 'database.db')
+    conn = sqlite3.connect(database)
+    applied = migrate(conn, storage=db.StorageConfig.from_env())
+    print(f"Schema version: {current_version(conn)} ({len(applied)} migration(s) applied)")
+    conn.close()
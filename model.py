@@ -1,18 +1,251 @@
 import pandas as pd
 import numpy as np
-from sklearn.ensemble import RandomForestClassifier
+from sklearn.ensemble import GradientBoostingClassifier, RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
 from sklearn.preprocessing import LabelEncoder, StandardScaler
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import accuracy_score
+import sklearn
 import pickle
 import sqlite3
+import logging
 import os
+import threading
+import time
+from datetime import datetime
+
+import model_artifacts
+
+logger = logging.getLogger(__name__)
+
+# Fraction of per-prediction log events that are kept
+PREDICTION_LOG_SAMPLE_RATE = float(os.environ.get('LOG_PREDICTION_SAMPLE_RATE', 0.01))
+# How often a serving model checks whether another process moved models/CURRENT
+MODEL_RELOAD_SECONDS = float(os.environ.get('MODEL_RELOAD_SECONDS', 5))
+
+FEATURE_COLUMNS = ['usia', 'jenis_kelamin', 'lokasi', 'pendidikan', 'pengalaman',
+                   'skor_pretest', 'minat_1', 'minat_2', 'minat_3', 'minat_4', 'minat_5']
+CATEGORICAL_COLUMNS = ['jenis_kelamin', 'lokasi', 'pendidikan']
+NUMERICAL_COLUMNS = ['usia', 'pengalaman', 'skor_pretest', 'minat_1', 'minat_2', 'minat_3', 'minat_4', 'minat_5']
+
+# Values used when a feature is missing from user_data (everything else defaults to 0)
+FEATURE_DEFAULTS = {'minat_4': 3, 'minat_5': 3, 'lokasi': 'Jakarta'}
+
+
+# Estimator families a RecommendationModel can be trained as
+ESTIMATORS = {
+    'random_forest': lambda: RandomForestClassifier(n_estimators=50, max_depth=8, min_samples_split=5,
+                                                    min_samples_leaf=2, random_state=42),
+    'gradient_boosting': lambda: GradientBoostingClassifier(n_estimators=50, max_depth=3, random_state=42),
+    'logistic': lambda: LogisticRegression(max_iter=1000),
+}
+DEFAULT_ESTIMATOR = 'random_forest'
+
+SAMPLE_LOKASI = ['Jakarta', 'Bandung', 'Surabaya', 'Medan', 'Makassar']
+SAMPLE_PENDIDIKAN = ['SMA', 'D3', 'S1', 'S2', 'S3']
+
+
+def determine_levels(data):
+    """Rule-based level_rekomendasi for a whole frame (or dict of arrays) at once.
+
+    Usia, skor_pretest, pengalaman and mean minat each add 1-3 points by band;
+    a total of <= 6 is Pemula, <= 9 Menengah, otherwise Lanjutan.
+    """
+    avg_interest = (np.asarray(data['minat_1']) + np.asarray(data['minat_2']) + np.asarray(data['minat_3'])
+                    + np.asarray(data['minat_4']) + np.asarray(data['minat_5'])) / 5
+    score = (np.digitize(data['usia'], [25, 40])
+             + np.digitize(data['skor_pretest'], [40, 70])
+             + np.digitize(data['pengalaman'], [5, 10])
+             + np.digitize(avg_interest, [2.5, 4])
+             + 4)
+    return np.select([score <= 6, score <= 9], ['Pemula', 'Menengah'], 'Lanjutan')
+
+
+def iter_sample_data(n_samples, chunk_size=100000, seed=42):
+    """Yield synthetic training/load-test frames of at most chunk_size rows"""
+    rng = np.random.default_rng(seed)
+    remaining = n_samples
+    while remaining > 0:
+        n = min(chunk_size, remaining)
+        data = {
+            'usia': rng.integers(18, 65, n),
+            'jenis_kelamin': rng.choice(['L', 'P'], n),
+            'lokasi': rng.choice(SAMPLE_LOKASI, n),
+            'pendidikan': rng.choice(SAMPLE_PENDIDIKAN, n),
+            'pengalaman': rng.integers(0, 20, n),
+            'skor_pretest': rng.integers(0, 101, n),
+            'minat_1': rng.integers(1, 6, n),
+            'minat_2': rng.integers(1, 6, n),
+            'minat_3': rng.integers(1, 6, n),
+            'minat_4': rng.integers(1, 6, n),
+            'minat_5': rng.integers(1, 6, n),
+        }
+        data['level_rekomendasi'] = determine_levels(data)
+        yield pd.DataFrame(data)
+        remaining -= n
+
+
+class FlatForest:
+    """A fitted forest flattened into plain NumPy arrays.
+
+    All trees share one node table (children, split feature, threshold and
+    normalized leaf distribution), so the arrays can be saved with joblib and
+    memory-mapped by every worker, and the whole forest is walked level by
+    level with vectorized indexing instead of per-tree calls.
+    """
+
+    def __init__(self, left, right, feature, threshold, value, roots, classes, max_depth):
+        self.left = left
+        self.right = right
+        self.feature = feature
+        self.threshold = threshold
+        self.value = value
+        self.roots = roots
+        self.classes_ = classes
+        self.max_depth = int(max_depth)
+
+    @classmethod
+    def from_estimator(cls, forest):
+        lefts, rights, features, thresholds, values, roots = [], [], [], [], [], []
+        offset = 0
+        max_depth = 0
+        n_classes = len(forest.classes_)
+        for estimator in forest.estimators_:
+            tree = estimator.tree_
+            left = tree.children_left.astype(np.int64)
+            right = tree.children_right.astype(np.int64)
+            is_leaf = left == -1
+            lefts.append(np.where(is_leaf, -1, left + offset))
+            rights.append(np.where(is_leaf, -1, right + offset))
+            # Leaves get feature 0 so indexing stays in bounds; they never move anyway
+            features.append(np.where(is_leaf, 0, tree.feature).astype(np.int64))
+            thresholds.append(tree.threshold)
+            value = tree.value[:, 0, :n_classes].astype(np.float64)
+            values.append(value / value.sum(axis=1, keepdims=True))
+            roots.append(offset)
+            offset += tree.node_count
+            max_depth = max(max_depth, tree.max_depth)
+        return cls(np.concatenate(lefts), np.concatenate(rights), np.concatenate(features),
+                   np.concatenate(thresholds), np.concatenate(values), np.asarray(roots, dtype=np.int64),
+                   np.asarray(forest.classes_), max_depth)
+
+    def to_arrays(self):
+        return {
+            'left': self.left, 'right': self.right, 'feature': self.feature,
+            'threshold': self.threshold, 'value': self.value, 'roots': self.roots,
+            'classes': self.classes_, 'max_depth': self.max_depth,
+        }
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        return cls(arrays['left'], arrays['right'], arrays['feature'], arrays['threshold'],
+                   arrays['value'], arrays['roots'], arrays['classes'], arrays['max_depth'])
+
+    def predict_proba(self, X):
+        # sklearn compares float32 features against the float64 thresholds
+        X = np.asarray(X, dtype=np.float32)
+        rows = np.arange(X.shape[0])[:, np.newaxis]
+        node = np.broadcast_to(self.roots, (X.shape[0], len(self.roots))).copy()
+        for _ in range(self.max_depth):
+            left = self.left[node]
+            go_left = X[rows, self.feature[node]] <= self.threshold[node]
+            node = np.where(left == -1, node, np.where(go_left, left, self.right[node]))
+        return self.value[node].mean(axis=1)
+
+
+class CompiledPredictor:
+    """Pandas-free inference state compiled from a fitted model, scaler and encoders.
+
+    Category labels become plain dict lookups, the StandardScaler is folded into
+    one multiply-add over the feature vector, and a forest is flattened into a
+    FlatForest, so one predict_proba pass yields label and confidence.
+    """
+
+    def __init__(self, model, scaler, label_encoders, feature_columns=None):
+        if hasattr(model, 'estimators_') and all(hasattr(e, 'tree_') for e in model.estimators_):
+            model = FlatForest.from_estimator(model)
+        self.model = model
+        if feature_columns is None:
+            feature_columns = list(getattr(model, 'feature_names_in_', FEATURE_COLUMNS))
+        self.columns = list(feature_columns)
+        self.classes = np.asarray(model.classes_)
+
+        self.category_codes = {
+            col: {str(label): code for code, label in enumerate(encoder.classes_)}
+            for col, encoder in label_encoders.items()
+        }
+
+        # x_scaled = x * multiplier + offset, identity for the categorical columns
+        self.multiplier = np.ones(len(self.columns))
+        self.offset = np.zeros(len(self.columns))
+        scaled_columns = list(getattr(scaler, 'feature_names_in_', NUMERICAL_COLUMNS))
+        for i, col in enumerate(scaled_columns):
+            j = self.columns.index(col)
+            self.multiplier[j] = 1.0 / scaler.scale_[i]
+            self.offset[j] = -scaler.mean_[i] / scaler.scale_[i]
+
+    def encode(self, user_data):
+        """Raw (unscaled) feature vector for a user_data dict"""
+        row = np.empty(len(self.columns))
+        for j, col in enumerate(self.columns):
+            value = user_data.get(col, FEATURE_DEFAULTS.get(col, 0))
+            codes = self.category_codes.get(col)
+            if codes is not None:
+                # Unseen labels fall back to code 0
+                value = codes.get(str(value), 0)
+            row[j] = value
+        return row
+
+    def encode_columns(self, columns, n_rows):
+        """Raw feature matrix from a {column: sequence of values} mapping"""
+        X = np.empty((n_rows, len(self.columns)))
+        for j, col in enumerate(self.columns):
+            default = FEATURE_DEFAULTS.get(col, 0)
+            values = columns.get(col)
+            if values is None:
+                X[:, j] = self.category_codes[col].get(str(default), 0) if col in self.category_codes else default
+                continue
+            codes = self.category_codes.get(col)
+            if codes is not None:
+                X[:, j] = [codes.get(str(default if v is None else v), 0) for v in values]
+            else:
+                X[:, j] = [default if v is None else v for v in values]
+        return X
+
+    def predict_proba(self, X):
+        """Class probabilities for a matrix of raw feature vectors"""
+        return self.model.predict_proba(X * self.multiplier + self.offset)
+
+    def predict(self, user_data):
+        """(label, confidence) for a single user_data dict"""
+        proba = self.predict_proba(self.encode(user_data)[np.newaxis, :])[0]
+        best = int(np.argmax(proba))
+        return self.classes[best], float(proba[best])
+
 
 class RecommendationModel:
-    def __init__(self):
+    def __init__(self, estimator=DEFAULT_ESTIMATOR, artifact_dir=None):
+        if estimator not in ESTIMATORS:
+            raise ValueError(f"Unknown estimator {estimator}")
+        self.estimator = estimator
         self.model = None
         self.scaler = StandardScaler()
         self.label_encoders = {}
+        self.predictor = None
+        self.model_version = None
+        self.last_accuracy = None
+        # True while model_version is the artifact dir's CURRENT (loaded or saved), so refresh() may follow it;
+        # an unsaved candidate must not be replaced by whatever is on disk
+        self.follows_current = False
+        self._next_refresh = 0.0
+        self._refresh_lock = threading.Lock()
+        # Non-default estimators keep their bundles next to the default ones, e.g. models_logistic
+        if artifact_dir is None:
+            artifact_dir = os.environ.get('MODEL_DIR', 'models')
+            if estimator != DEFAULT_ESTIMATOR:
+                artifact_dir = f'{artifact_dir}_{estimator}'
+        self.artifact_dir = artifact_dir
+        # Legacy single-file pickles, still read when no bundle exists yet
         self.model_path = 'recommendation_model.pkl'
         self.scaler_path = 'scaler.pkl'
         self.encoders_path = 'label_encoders.pkl'
@@ -24,8 +257,8 @@ class RecommendationModel:
         data = {
             'usia': np.random.randint(18, 65, n_samples),
             'jenis_kelamin': np.random.choice(['L', 'P'], n_samples),
-            'lokasi': np.random.choice(['Jakarta', 'Bandung', 'Surabaya', 'Medan', 'Makassar'], n_samples),
-            'pendidikan': np.random.choice(['SMA', 'D3', 'S1', 'S2', 'S3'], n_samples),
+            'lokasi': np.random.choice(SAMPLE_LOKASI, n_samples),
+            'pendidikan': np.random.choice(SAMPLE_PENDIDIKAN, n_samples),
             'pengalaman': np.random.randint(0, 20, n_samples),
             'skor_pretest': np.random.randint(0, 101, n_samples),
             'minat_1': np.random.randint(1, 6, n_samples),
@@ -38,51 +271,7 @@ class RecommendationModel:
         df = pd.DataFrame(data)
         
         # Generate target variable (level_rekomendasi) based on rules
-        def determine_level(row):
-            score = 0
-            
-            # Berdasarkan usia
-            if row['usia'] < 25:
-                score += 1
-            elif row['usia'] < 40:
-                score += 2
-            else:
-                score += 3
-                
-            # Berdasarkan skor pretest
-            if row['skor_pretest'] < 40:
-                score += 1
-            elif row['skor_pretest'] < 70:
-                score += 2
-            else:
-                score += 3
-                
-            # Berdasarkan pengalaman
-            if row['pengalaman'] < 5:
-                score += 1
-            elif row['pengalaman'] < 10:
-                score += 2
-            else:
-                score += 3
-                
-            # Berdasarkan minat rata-rata
-            avg_interest = (row['minat_1'] + row['minat_2'] + row['minat_3'] + row['minat_4'] + row['minat_5']) / 5
-            if avg_interest < 2.5:
-                score += 1
-            elif avg_interest < 4:
-                score += 2
-            else:
-                score += 3
-                
-            # Determine level based on total score
-            if score <= 6:
-                return 'Pemula'
-            elif score <= 9:
-                return 'Menengah'
-            else:
-                return 'Lanjutan'
-        
-        df['level_rekomendasi'] = df.apply(determine_level, axis=1)
+        df['level_rekomendasi'] = determine_levels(df)
         
         return df
     
@@ -91,9 +280,7 @@ class RecommendationModel:
         df_processed = df.copy()
         
         # Encode categorical variables
-        categorical_columns = ['jenis_kelamin', 'lokasi', 'pendidikan']
-        
-        for col in categorical_columns:
+        for col in CATEGORICAL_COLUMNS:
             if col not in self.label_encoders:
                 self.label_encoders[col] = LabelEncoder()
             df_processed[col] = self.label_encoders[col].fit_transform(df_processed[col].astype(str))
@@ -103,20 +290,19 @@ class RecommendationModel:
         y = df_processed['level_rekomendasi']
         
         # Scale numerical features
-        numerical_columns = ['usia', 'pengalaman', 'skor_pretest', 'minat_1', 'minat_2', 'minat_3', 'minat_4', 'minat_5']
-        X[numerical_columns] = self.scaler.fit_transform(X[numerical_columns])
+        X[NUMERICAL_COLUMNS] = self.scaler.fit_transform(X[NUMERICAL_COLUMNS])
         
         return X, y
     
-    def train_model(self, df=None):
-        """Train the recommendation model"""
+    def train_model(self, df=None, save=True):
+        """Train the recommendation model (save=False leaves the artifacts on disk untouched)"""
         try:
             # Use provided data or generate sample data
             if df is None:
-                print("Generating sample data for training...")
+                logger.info("Generating sample data for training...")
                 df = self.generate_sample_data(100)  # Reduced sample size for faster training
             
-            print(f"Training model with {len(df)} samples...")
+            logger.info("Training model with %d samples...", len(df))
             
             # Preprocess data
             X, y = self.preprocess_data(df)
@@ -124,163 +310,241 @@ class RecommendationModel:
             # Split data
             X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
             
-            # Train model with simpler parameters for reliability
-            self.model = RandomForestClassifier(
-                n_estimators=50,  # Reduced for faster training
-                max_depth=8,
-                min_samples_split=5,
-                min_samples_leaf=2,
-                random_state=42
-            )
+            # Fit on plain arrays: serving passes arrays, not DataFrames
+            self.model = ESTIMATORS[self.estimator]()
             
-            self.model.fit(X_train, y_train)
+            self.model.fit(X_train.to_numpy(), y_train)
             
             # Evaluate model
-            y_pred = self.model.predict(X_test)
+            y_pred = self.model.predict(X_test.to_numpy())
             accuracy = accuracy_score(y_test, y_pred)
-            print(f"Model trained with accuracy: {accuracy:.2f}")
+            self.last_accuracy = accuracy
+            logger.info("Model trained with accuracy: %.2f", accuracy,
+                        extra={'data': {'estimator': self.estimator, 'accuracy': accuracy}})
+            
+            self.follows_current = False
+            self.predictor = CompiledPredictor(self.model, self.scaler, self.label_encoders, list(X.columns))
+            self.model_version = datetime.utcnow().strftime('%Y%m%d%H%M%S%f')
             
             # Save model and preprocessing objects
-            self.save_model()
+            if save:
+                self.save_model()
             
             return True
             
-        except Exception as e:
-            print(f"Error training model: {str(e)}")
-            import traceback
-            traceback.print_exc()
+        except Exception:
+            logger.exception("Error training model")
             return False
     
+    def adopt(self, other):
+        """Swap in the trained state of another RecommendationModel.
+
+        Predictions only go through self.predictor, a single reference, so a
+        concurrent request sees either the old model or the new one, never a mix.
+        """
+        if other.predictor is None:
+            raise ValueError("Cannot adopt an untrained model")
+        # Until save_model() makes it CURRENT, the old version on disk must not be reloaded over it
+        self.follows_current = False
+        self.model = other.model
+        self.scaler = other.scaler
+        self.label_encoders = other.label_encoders
+        self.last_accuracy = other.last_accuracy
+        self.predictor = other.predictor
+        # Version last: a cache key built from the new version always maps to the new predictor
+        self.model_version = other.model_version
+    
     def predict_recommendation(self, user_data):
         """Predict recommendation for a user"""
+        return self.predict_with_confidence(user_data)[0]
+    
+    def predict_with_confidence(self, user_data):
+        """Predict (recommendation, confidence) for a user via the compiled fast path.
+
+        Falls back to ('Pemula', 0.0) when the model is unavailable or fails;
+        callers treat confidence 0.0 as "not a real prediction" (e.g. not cached).
+        """
         try:
-            if self.model is None:
+            self.refresh()
+            predictor = self.predictor
+            if predictor is None:
                 if not self.load_model():
-                    print("Model not available, returning default recommendation")
-                    return 'Pemula'
-            
-            # Create DataFrame from user data
-            user_df = pd.DataFrame([user_data])
-            
-            # Preprocess user data
-            categorical_columns = ['jenis_kelamin', 'lokasi', 'pendidikan']
-            
-            for col in categorical_columns:
-                if col in user_df.columns and col in self.label_encoders:
-                    # Handle unseen categories
-                    if user_df[col].iloc[0] in self.label_encoders[col].classes_:
-                        user_df[col] = self.label_encoders[col].transform([user_df[col].iloc[0]])[0]
-                    else:
-                        # Use default value for unseen labels
-                        user_df[col] = 0
-            
-            # Ensure all required columns are present
-            required_columns = ['usia', 'jenis_kelamin', 'lokasi', 'pendidikan', 'pengalaman', 
-                              'skor_pretest', 'minat_1', 'minat_2', 'minat_3', 'minat_4', 'minat_5']
+                    logger.warning("Model not available, returning default recommendation")
+                    return 'Pemula', 0.0
+                predictor = self.predictor
             
-            for col in required_columns:
-                if col not in user_df.columns:
-                    if col in ['minat_4', 'minat_5', 'lokasi']:
-                        # Set default values for optional columns
-                        if col.startswith('minat'):
-                            user_df[col] = 3
-                        elif col == 'lokasi':
-                            user_df[col] = 'Jakarta'
-                    else:
-                        user_df[col] = 0
+            prediction, probability = predictor.predict(user_data)
             
-            # Scale numerical features
-            numerical_columns = ['usia', 'pengalaman', 'skor_pretest', 'minat_1', 'minat_2', 'minat_3', 'minat_4', 'minat_5']
-            user_df[numerical_columns] = self.scaler.transform(user_df[numerical_columns])
+            logger.info("Prediction", extra={'data': {'prediction': str(prediction), 'confidence': probability,
+                                                      'model_version': self.model_version},
+                                             'sample_rate': PREDICTION_LOG_SAMPLE_RATE})
             
-            # Make prediction
-            prediction = self.model.predict(user_df)[0]
-            probability = np.max(self.model.predict_proba(user_df))
+            return prediction, probability
             
-            print(f"Prediction: {prediction} (confidence: {probability:.2f})")
-            
-            return prediction
-            
-        except Exception as e:
-            print(f"Error making prediction: {str(e)}")
-            import traceback
-            traceback.print_exc()
-            return 'Pemula'  # Default fallback
+        except Exception:
+            logger.exception("Error making prediction")
+            return 'Pemula', 0.0  # Default fallback
+    
+    def predict_batch(self, records):
+        """Predict (labels, confidences) arrays for many users at once.
+
+        records is either a list of user_data dicts or a {column: sequence}
+        mapping; the whole batch is scored as one NumPy matrix.
+        """
+        self.refresh()
+        predictor = self.predictor
+        if predictor is None:
+            if not self.load_model():
+                raise RuntimeError("Model not available for batch prediction")
+            predictor = self.predictor
+        
+        if isinstance(records, dict):
+            n_rows = len(next(iter(records.values()), []))
+            columns = records
+        else:
+            n_rows = len(records)
+            columns = {col: [r.get(col) for r in records] for col in predictor.columns}
+        
+        if n_rows == 0:
+            return np.array([], dtype=object), np.array([])
+        
+        proba = predictor.predict_proba(predictor.encode_columns(columns, n_rows))
+        best = np.argmax(proba, axis=1)
+        return predictor.classes[best], proba[np.arange(n_rows), best]
     
     def save_model(self):
-        """Save the trained model and preprocessing objects"""
+        """Save the trained model and preprocessing objects as a versioned bundle"""
         try:
-            with open(self.model_path, 'wb') as f:
-                pickle.dump(self.model, f)
-            
-            with open(self.scaler_path, 'wb') as f:
-                pickle.dump(self.scaler, f)
-            
-            with open(self.encoders_path, 'wb') as f:
-                pickle.dump(self.label_encoders, f)
+            if self.predictor is None:
+                logger.warning("No trained model to save")
+                return False
             
-            print("Model saved successfully")
+            if model_artifacts.current_version(self.artifact_dir) == self.model_version:
+                self.follows_current = True
+                return True
+            
+            predictor = self.predictor
+            forest = predictor.model if isinstance(predictor.model, FlatForest) else None
+            payload = {
+                'forest': forest.to_arrays() if forest is not None else None,
+                'estimator': None if forest is not None else predictor.model,
+                'scaler': self.scaler,
+                'label_encoders': self.label_encoders,
+                'feature_columns': predictor.columns,
+            }
+            metadata = {
+                'estimator': type(self.model).__name__,
+                'sklearn_version': sklearn.__version__,
+                'feature_columns': predictor.columns,
+                'classes': [str(c) for c in predictor.classes],
+                'accuracy': self.last_accuracy,
+            }
+            model_artifacts.save_bundle(self.artifact_dir, self.model_version, payload, metadata)
+            self.follows_current = True
+            
+            logger.info("Model %s saved successfully", self.model_version)
             return True
             
-        except Exception as e:
-            print(f"Error saving model: {str(e)}")
+        except Exception:
+            logger.exception("Error saving model")
             return False
     
     def load_model(self):
-        """Load the trained model and preprocessing objects"""
+        """Load the current model bundle (arrays memory-mapped), or the legacy pickles"""
         try:
-            if not os.path.exists(self.model_path):
-                print("Model file not found")
-                return False
-            
-            with open(self.model_path, 'rb') as f:
-                self.model = pickle.load(f)
-            
-            with open(self.scaler_path, 'rb') as f:
-                self.scaler = pickle.load(f)
-            
-            with open(self.encoders_path, 'rb') as f:
-                self.label_encoders = pickle.load(f)
-            
-            print("Model loaded successfully")
+            if model_artifacts.current_version(self.artifact_dir) is None:
+                if self.estimator != DEFAULT_ESTIMATOR:
+                    logger.info("No %s model bundle found", self.estimator)
+                    return False
+                return self._load_legacy_pickles()
+            
+            payload, manifest = model_artifacts.load_bundle(self.artifact_dir, mmap_mode='r')
+            if payload['forest'] is not None:
+                model = FlatForest.from_arrays(payload['forest'])
+            else:
+                model = payload['estimator']
+            
+            predictor = CompiledPredictor(model, payload['scaler'], payload['label_encoders'],
+                                          payload['feature_columns'])
+            self.model = model
+            self.scaler = payload['scaler']
+            self.label_encoders = payload['label_encoders']
+            self.last_accuracy = manifest.get('accuracy')
+            self.predictor = predictor
+            self.model_version = manifest['model_version']
+            self.follows_current = True
+            
+            logger.info("Model %s loaded successfully", self.model_version)
             return True
             
-        except Exception as e:
-            print(f"Error loading model: {str(e)}")
+        except Exception:
+            logger.exception("Error loading model")
             return False
     
-    def get_user_data_from_db(self):
-        """Get user data from database for training"""
+    def refresh(self):
+        """Reload if CURRENT moved to another version (e.g. promoted by another worker); True if reloaded
+
+        Checked at most every MODEL_RELOAD_SECONDS, by one thread at a time; the
+        others keep serving the loaded version meanwhile.
+        """
+        now = time.monotonic()
+        if now < self._next_refresh or not self._refresh_lock.acquire(blocking=False):
+            return False
         try:
-            conn = sqlite3.connect('database.db')
-            
-            # Query to get user profiles with pretest scores
-            query = '''
-            SELECT 
-                up.usia, 
-                up.jenis_kelamin, 
-                up.lokasi,
-                up.pendidikan,
-                up.pengalaman,
-                pr.score as skor_pretest,
-                up.minat_1,
-                up.minat_2, 
-                up.minat_3,
-                up.minat_4,
-                up.minat_5,
-                up.level_rekomendasi
-            FROM user_profiles up
-            JOIN pretest_results pr ON up.user_id = pr.user_id
-            WHERE up.level_rekomendasi IS NOT NULL
-            '''
-            
-            df = pd.read_sql_query(query, conn)
-            conn.close()
+            self._next_refresh = now + MODEL_RELOAD_SECONDS
+            if self.predictor is not None and not self.follows_current:
+                return False
+            version = model_artifacts.current_version(self.artifact_dir)
+            if version is None or version == self.model_version:
+                return False
+            logger.info("Model version changed on disk (%s -> %s), reloading", self.model_version, version)
+            return self.load_model()
+        finally:
+            self._refresh_lock.release()
+    
+    def _load_legacy_pickles(self):
+        """Load the pre-bundle recommendation_model.pkl / scaler.pkl / label_encoders.pkl"""
+        if not os.path.exists(self.model_path):
+            logger.info("Model file not found")
+            return False
+        
+        with open(self.model_path, 'rb') as f:
+            model = pickle.load(f)
+        
+        with open(self.scaler_path, 'rb') as f:
+            scaler = pickle.load(f)
+        
+        with open(self.encoders_path, 'rb') as f:
+            label_encoders = pickle.load(f)
+        
+        self.model = model
+        self.scaler = scaler
+        self.label_encoders = label_encoders
+        self.predictor = CompiledPredictor(model, scaler, label_encoders)
+        self.model_version = str(os.path.getmtime(self.model_path))
+        
+        logger.info("Legacy model loaded successfully")
+        return True
+    
+    def get_user_data_from_db(self, chunk_size=10000):
+        """Get training data: sync new/changed users into the feature store, then read it"""
+        from feature_store import FeatureStore
+        
+        try:
+            conn = sqlite3.connect(os.environ.get('DATABASE_PATH', 'database.db'))
+            store = FeatureStore()
+            try:
+                copied = store.sync(conn, chunk_size)
+                logger.info("Feature store synced (%d new or changed users)", copied)
+                df = store.load_frame()
+            finally:
+                store.close()
+                conn.close()
             
             return df if not df.empty else None
             
-        except Exception as e:
-            print(f"Error getting data from database: {str(e)}")
+        except Exception:
+            logger.exception("Error getting data from database")
             return None
 
 # Global instance
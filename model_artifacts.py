@@ -0,0 +1,138 @@
+"""Versioned model artifact bundles.
+
+A bundle is one directory per model version under the artifact root:
+
+    models/
+        CURRENT                     -> name of the active version
+        20240101120000000000/
+            bundle.joblib           predictor arrays, scaler, encoders
+            manifest.json           version, metadata, sha256 of bundle.joblib
+
+Bundles are written to a temporary directory and renamed into place, and
+CURRENT is swapped with os.replace, so readers never see a partial bundle.
+Uncompressed joblib stores the NumPy arrays (including a flattened forest)
+so they can be loaded with mmap_mode='r' and shared between worker processes.
+"""
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from datetime import datetime
+
+import joblib
+
+
+FORMAT_VERSION = 1
+BUNDLE_FILE = 'bundle.joblib'
+MANIFEST_FILE = 'manifest.json'
+CURRENT_FILE = 'CURRENT'
+
+
+class ArtifactError(Exception):
+    """Raised when a bundle is missing, incomplete or fails its checksum"""
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _write_atomic(path, data):
+    directory = os.path.dirname(path) or '.'
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def save_bundle(root, version, payload, metadata=None, keep=3):
+    """Write payload as a new bundle version and make it CURRENT"""
+    os.makedirs(root, exist_ok=True)
+    final_dir = os.path.join(root, version)
+    if os.path.exists(final_dir):
+        raise ArtifactError(f"Bundle version {version} already exists")
+
+    tmp_dir = tempfile.mkdtemp(dir=root, prefix='.tmp-')
+    try:
+        bundle_path = os.path.join(tmp_dir, BUNDLE_FILE)
+        joblib.dump(payload, bundle_path)
+
+        manifest = dict(metadata or {})
+        manifest.update({
+            'format_version': FORMAT_VERSION,
+            'model_version': version,
+            'created_at': datetime.utcnow().isoformat(),
+            'files': {
+                BUNDLE_FILE: {
+                    'sha256': file_sha256(bundle_path),
+                    'bytes': os.path.getsize(bundle_path),
+                },
+            },
+        })
+        with open(os.path.join(tmp_dir, MANIFEST_FILE), 'w') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+            f.flush()
+            os.fsync(f.fileno())
+
+        os.rename(tmp_dir, final_dir)
+    except Exception:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+    _write_atomic(os.path.join(root, CURRENT_FILE), version + '\n')
+    prune_bundles(root, keep)
+    return manifest
+
+
+def current_version(root):
+    try:
+        with open(os.path.join(root, CURRENT_FILE)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+
+def load_bundle(root, version=None, mmap_mode='r', verify=True):
+    """Return (payload, manifest) for a bundle version (CURRENT by default)"""
+    version = version or current_version(root)
+    if version is None:
+        raise ArtifactError(f"No model bundle in {root}")
+
+    bundle_dir = os.path.join(root, version)
+    try:
+        with open(os.path.join(bundle_dir, MANIFEST_FILE)) as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        raise ArtifactError(f"Bundle {version} has no manifest")
+
+    if manifest.get('format_version') != FORMAT_VERSION:
+        raise ArtifactError(f"Unsupported bundle format {manifest.get('format_version')}")
+
+    bundle_path = os.path.join(bundle_dir, BUNDLE_FILE)
+    if verify:
+        expected = manifest['files'][BUNDLE_FILE]['sha256']
+        if file_sha256(bundle_path) != expected:
+            raise ArtifactError(f"Checksum mismatch for bundle {version}")
+
+    return joblib.load(bundle_path, mmap_mode=mmap_mode), manifest
+
+
+def prune_bundles(root, keep):
+    """Delete all but the newest `keep` bundle versions (never CURRENT)"""
+    active = current_version(root)
+    versions = sorted(name for name in os.listdir(root)
+                      if not name.startswith('.') and os.path.isdir(os.path.join(root, name)))
+    for name in versions[:-keep] if keep else []:
+        if name != active:
+            shutil.rmtree(os.path.join(root, name), ignore_errors=True)
@@ -0,0 +1,239 @@
+"""Several recommenders served side by side for model-variant A/B tests.
+
+Personalized-arm users are split across the registered variants by the same
+salted-hash assignment as the experiments (assignment.Experiment), so a user
+always gets the same model. Each variant records its inference latency and
+confidence in memory; outcomes come from joining the model_variant exposures
+with user_outcomes. Users of a variant whose model is not loaded yet are
+served by the default variant and not recorded as exposed to theirs.
+
+    MODEL_VARIANTS=random_forest:2,gradient_boosting:1,logistic:1,fallback:1
+"""
+import collections
+import logging
+import os
+import threading
+import time
+
+import assignment
+import instrumentation
+
+logger = logging.getLogger(__name__)
+
+
+FALLBACK_VARIANT = 'fallback'
+VARIANT_EXPERIMENT = 'model_variant'
+
+
+class FallbackModel:
+    """Rule-based recommendations from the pretest score alone"""
+
+    model_version = 'rules-v1'
+    last_accuracy = None
+
+    def predict_recommendation(self, user_data):
+        # Simple rule-based fallback
+        score = user_data.get('skor_pretest', 0)
+        if score < 40:
+            return 'Pemula'
+        elif score < 70:
+            return 'Menengah'
+        else:
+            return 'Lanjutan'
+
+    def predict_with_confidence(self, user_data):
+        return self.predict_recommendation(user_data), 1.0
+
+    def load_model(self):
+        return True
+
+    def train_model(self):
+        return True
+
+
+class VariantMetrics:
+    """Prediction counts, latency quantiles over a recent window and mean confidence"""
+
+    def __init__(self, window=2048):
+        self._lock = threading.Lock()
+        self._latencies = collections.deque(maxlen=window)
+        self.predictions = 0
+        self.cache_hits = 0
+        self.errors = 0
+        self.latency_total = 0.0
+        self.confidence_total = 0.0
+
+    def record(self, latency, confidence):
+        with self._lock:
+            self.predictions += 1
+            self.latency_total += latency
+            self.confidence_total += confidence or 0.0
+            self._latencies.append(latency)
+
+    def record_cache_hit(self):
+        with self._lock:
+            self.cache_hits += 1
+
+    def record_error(self):
+        with self._lock:
+            self.errors += 1
+
+    def snapshot(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            computed = self.predictions
+
+            def quantile(q):
+                return latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000 if latencies else None
+
+            return {
+                'predictions': computed,
+                'cache_hits': self.cache_hits,
+                'errors': self.errors,
+                'latency_avg_ms': self.latency_total / computed * 1000 if computed else None,
+                'latency_p50_ms': quantile(0.50),
+                'latency_p95_ms': quantile(0.95),
+                'latency_p99_ms': quantile(0.99),
+                'confidence_avg': self.confidence_total / computed if computed else None,
+            }
+
+
+def parse_variants(spec):
+    """[(name, weight)] from "name:weight,name:weight" (weight defaults to 1)"""
+    variants = []
+    for item in filter(None, (part.strip() for part in spec.split(','))):
+        name, _, weight = item.partition(':')
+        variants.append((name.strip(), float(weight) if weight else 1.0))
+    return variants
+
+
+class ModelRegistry:
+    def __init__(self, models, weights, salt='model-variant-v1', default=None):
+        """models: {variant name: model}; weights: {variant name: routing weight}
+
+        default serves the users of variants whose model is not loaded yet.
+        """
+        self.models = dict(models)
+        self.default = default or next(iter(self.models))
+        self._training = None
+        self.experiment = assignment.Experiment(
+            VARIANT_EXPERIMENT, salt,
+            [assignment.Arm(name, weights.get(name, 1.0)) for name in self.models],
+            baseline=next(iter(self.models)))
+        self._metrics = {name: VariantMetrics() for name in self.models}
+
+    @classmethod
+    def from_env(cls, primary_model, ml_available=True, environ=None):
+        """Registry from MODEL_VARIANTS; the default estimator variant is primary_model itself"""
+        env = os.environ if environ is None else environ
+        if ml_available:
+            from model import DEFAULT_ESTIMATOR, RecommendationModel
+            spec = parse_variants(env.get('MODEL_VARIANTS') or f'{DEFAULT_ESTIMATOR}:1')
+        else:
+            spec = [(FALLBACK_VARIANT, 1.0)]
+
+        models = {}
+        for name, _ in spec:
+            if name == FALLBACK_VARIANT:
+                models[name] = FallbackModel()
+            elif name == DEFAULT_ESTIMATOR:
+                models[name] = primary_model
+            else:
+                models[name] = RecommendationModel(estimator=name)
+        default = next((name for name, model in models.items() if model is primary_model), None)
+        return cls(models, dict(spec), salt=env.get('MODEL_VARIANT_SALT', 'model-variant-v1'), default=default)
+
+    def is_loaded(self, variant):
+        # FallbackModel has no predictor and is always ready
+        return getattr(self.models[variant], 'predictor', True) is not None
+
+    def ensure_loaded(self, train=True):
+        """Load every variant's current bundle, training the ones that have none; returns those still missing"""
+        missing = []
+        for name, model in self.models.items():
+            if self.is_loaded(name) or model.load_model():
+                continue
+            if train:
+                logger.info("Training %s model variant...", name)
+                model.train_model()
+            if not self.is_loaded(name):
+                missing.append(name)
+        return missing
+
+    def train_in_background(self, variants):
+        """Train variants on a daemon thread; until each is loaded, serving() routes its users to the default"""
+        def work():
+            for name in variants:
+                logger.info("Training %s model variant...", name)
+                try:
+                    self.models[name].train_model()
+                except Exception:
+                    logger.exception("Training %s model variant failed", name)
+
+        self._training = threading.Thread(target=work, name='model-variant-training', daemon=True)
+        self._training.start()
+        return self._training
+
+    def wait_for_training(self, timeout=None):
+        if self._training is not None:
+            self._training.join(timeout)
+
+    def route(self, username):
+        return self.experiment.assign(username)
+
+    def serving(self, variant):
+        """The variant that actually serves a user routed to variant"""
+        if not self.is_loaded(variant):
+            # Another worker may have trained it since (throttled by MODEL_RELOAD_SECONDS)
+            self.models[variant].refresh()
+        return variant if self.is_loaded(variant) else self.default
+
+    def predict(self, variant, user_data, cache=None):
+        """(recommendation, confidence) from one variant, timing uncached inference only"""
+        model = self.models[variant]
+        metrics = self._metrics[variant]
+        key = None
+        if cache is not None:
+            key = cache.make_key(user_data, f"{variant}:{getattr(model, 'model_version', None)}")
+            value = cache.get(key)
+            if value is not None:
+                metrics.record_cache_hit()
+                return value
+
+        start = time.perf_counter()
+        try:
+            value = model.predict_with_confidence(user_data)
+        except Exception:
+            metrics.record_error()
+            raise
+        latency = time.perf_counter() - start
+        metrics.record(latency, value[1])
+        instrumentation.observe_inference(variant, latency)
+        # Confidence 0.0 is RecommendationModel's unavailable/error fallback; caching it would pin it for the TTL
+        if key is not None and value[1]:
+            cache.put(key, value)
+        return value
+
+    def outcomes(self, conn):
+        """{variant: {users, avg_improvement}} for users exposed to each variant"""
+        rows = conn.execute('''SELECT e.arm, COUNT(*) AS users, AVG(uo.posttest - uo.pretest) AS avg_improvement
+                               FROM (SELECT DISTINCT user_id, arm FROM experiment_exposures
+                                     WHERE experiment = ?) e
+                               JOIN user_outcomes uo ON uo.user_id = e.user_id
+                               WHERE uo.pretest IS NOT NULL AND uo.posttest IS NOT NULL
+                               GROUP BY e.arm''', (self.experiment.name,)).fetchall()
+        return {row['arm']: {'users': row['users'], 'avg_improvement': row['avg_improvement']} for row in rows}
+
+    def report(self, conn=None):
+        outcomes = self.outcomes(conn) if conn is not None else {}
+        return {
+            name: {
+                'weight': self.experiment.arms[name].weight,
+                'estimator': getattr(model, 'estimator', FALLBACK_VARIANT),
+                'model_version': getattr(model, 'model_version', None),
+                'accuracy': getattr(model, 'last_accuracy', None),
+                'metrics': self._metrics[name].snapshot(),
+                'outcomes': outcomes.get(name, {'users': 0, 'avg_improvement': None}),
+            }
+            for name, model in self.models.items()
+        }
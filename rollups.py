@@ -0,0 +1,42 @@
+"""Reads of the kelompok_rollups aggregates maintained by database triggers."""
+import math
+
+
+class RollupStats:
+    """Count / mean / variance of one metric for one kelompok, from n, sum and sum of squares"""
+
+    def __init__(self, n=0, total=0, total_sq=0):
+        self.n = n
+        self.total = total
+        self.total_sq = total_sq
+
+    @property
+    def mean(self):
+        return self.total / self.n if self.n else 0.0
+
+    @property
+    def variance(self):
+        """Sample variance (n - 1 denominator)"""
+        if self.n < 2:
+            return 0.0
+        return max(self.total_sq - self.total * self.total / self.n, 0.0) / (self.n - 1)
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+    def to_dict(self):
+        return {'n': self.n, 'mean': self.mean, 'variance': self.variance}
+
+
+def load_rollups(conn):
+    """{kelompok: {metric: RollupStats}} from kelompok_rollups"""
+    rollups = {}
+    for kelompok, metric, n, total, total_sq in conn.execute(
+            'SELECT kelompok, metric, n, total, total_sq FROM kelompok_rollups'):
+        rollups.setdefault(kelompok, {})[metric] = RollupStats(n, total, total_sq)
+    return rollups
+
+
+def metric(rollups, kelompok, name):
+    return rollups.get(kelompok, {}).get(name, RollupStats())
@@ -0,0 +1,69 @@
+"""Re-score every row in user_profiles with the current recommendation model.
+
+Profiles are streamed out of SQLite in id-ordered chunks, each chunk is scored
+as one matrix with predict_batch, and changed level_rekomendasi values are
+written back with executemany - all inside a single write transaction, so
+memory stays bounded by the chunk size regardless of cohort size.
+
+    python score_profiles.py --db database.db --chunk-size 5000
+"""
+import argparse
+import sqlite3
+import time
+
+import db
+import log_config
+from model import recommendation_model, FEATURE_COLUMNS
+
+
+def rescore_profiles(conn, model, chunk_size=5000):
+    """Stream, score and update all profiles; returns (scored, updated) counts"""
+    columns = ', '.join(FEATURE_COLUMNS)
+    query = f'''SELECT id, level_rekomendasi, {columns}
+                FROM user_profiles WHERE id > ? ORDER BY id LIMIT ?'''
+
+    def work(c):
+        # Local to the attempt, so a busy retry starts the counts over
+        scored = updated = 0
+        last_id = 0
+        while True:
+            rows = c.execute(query, (last_id, chunk_size)).fetchall()
+            if not rows:
+                break
+            last_id = rows[-1][0]
+
+            values = list(zip(*rows))
+            ids, current = values[0], values[1]
+            batch = dict(zip(FEATURE_COLUMNS, values[2:]))
+            labels, _ = model.predict_batch(batch)
+
+            changed = [(str(label), row_id) for row_id, old, label in zip(ids, current, labels)
+                       if old != label]
+            c.executemany('UPDATE user_profiles SET level_rekomendasi = ? WHERE id = ?', changed)
+
+            scored += len(rows)
+            updated += len(changed)
+        return scored, updated
+
+    return db.run_write(conn, work)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Re-score all user profiles in batch')
+    parser.add_argument('--db', default='database.db', help='SQLite database path')
+    parser.add_argument('--chunk-size', type=int, default=5000, help='Profiles scored per batch')
+    args = parser.parse_args()
+    log_config.configure()
+
+    if not recommendation_model.load_model():
+        print("Training recommendation model...")
+        recommendation_model.train_model()
+
+    conn = sqlite3.connect(args.db)
+    db.StorageConfig.from_env().apply(conn)
+
+    start = time.perf_counter()
+    scored, updated = rescore_profiles(conn, recommendation_model, args.chunk_size)
+    conn.close()
+
+    print(f"Scored {scored} profiles ({updated} updated) in {time.perf_counter() - start:.1f}s")
@@ -0,0 +1,149 @@
+"""Streaming experiment monitoring with always-valid p-values.
+
+Each user's first posttest adds one improvement observation to Welford
+running moments (n, mean, M2) for their kelompok, stored in the
+sequential_moments table and updated inside the posttest write transaction.
+From those moments every arm is compared with the baseline arm using a
+mixture sequential probability ratio test (mSPRT, normal mixture with
+variance tau^2 over the effect). Its p-value stays valid no matter how often
+the dashboard is checked, and reading it costs O(arms) per request.
+"""
+import math
+import os
+
+from assignment import HOLDOUT_ARM
+
+
+class SequentialConfig:
+    def __init__(self, baseline='control', alpha=0.05, tau=5.0, max_samples=0):
+        self.baseline = baseline
+        self.alpha = alpha
+        # Prior standard deviation of the effect (in score points) for the mixture
+        self.tau = tau
+        # Total observations after which to stop regardless (0 = no limit)
+        self.max_samples = max_samples
+
+    @classmethod
+    def from_env(cls, baseline='control'):
+        return cls(baseline=baseline,
+                   alpha=float(os.environ.get('SEQUENTIAL_ALPHA', 0.05)),
+                   tau=float(os.environ.get('SEQUENTIAL_TAU', 5.0)),
+                   max_samples=int(os.environ.get('SEQUENTIAL_MAX_SAMPLES', 0)))
+
+
+def welford_update(n, mean, m2, x):
+    """One Welford step: returns the updated (n, mean, M2)"""
+    n += 1
+    delta = x - mean
+    mean += delta / n
+    m2 += delta * (x - mean)
+    return n, mean, m2
+
+
+def variance(n, m2):
+    return m2 / (n - 1) if n > 1 else 0.0
+
+
+def msprt(treatment, control, tau):
+    """Likelihood ratio, always-valid p and confidence sequence half-width for the mean difference.
+
+    treatment/control are (n, mean, M2). Returns None until both arms have two
+    observations and non-zero variance.
+    """
+    (n1, mean1, m2_1), (n0, mean0, m2_0) = treatment, control
+    if n1 < 2 or n0 < 2:
+        return None
+    v = variance(n1, m2_1) / n1 + variance(n0, m2_0) / n0
+    if v <= 0:
+        return None
+    tau2 = tau * tau
+    diff = mean1 - mean0
+    log_lr = 0.5 * math.log(v / (v + tau2)) + diff * diff * tau2 / (2 * v * (v + tau2))
+    p_value = min(1.0, math.exp(-log_lr)) if log_lr < 700 else 0.0
+    return {'difference': diff, 'log_likelihood_ratio': log_lr, 'p_value': p_value, 'variance': v}
+
+
+def confidence_half_width(v, tau, alpha):
+    """Half-width of the (1 - alpha) always-valid confidence sequence for the difference"""
+    tau2 = tau * tau
+    return math.sqrt(v * (v + tau2) / tau2 * (math.log((v + tau2) / v) - 2 * math.log(alpha)))
+
+
+def load_moments(conn):
+    return {row[0]: (row[1], row[2], row[3])
+            for row in conn.execute('SELECT kelompok, n, mean, m2 FROM sequential_moments')}
+
+
+def record_observation(conn, kelompok, value, config):
+    """Fold one observation into the running moments and refresh the running-min p-values.
+
+    Call inside the write transaction that inserted the posttest row.
+    """
+    row = conn.execute('SELECT n, mean, m2 FROM sequential_moments WHERE kelompok = ?', (kelompok,)).fetchone()
+    n, mean, m2 = welford_update(*(tuple(row) if row else (0, 0.0, 0.0)), float(value))
+    conn.execute('''INSERT INTO sequential_moments (kelompok, n, mean, m2) VALUES (?, ?, ?, ?)
+                    ON CONFLICT(kelompok) DO UPDATE SET n = excluded.n, mean = excluded.mean, m2 = excluded.m2''',
+                 (kelompok, n, mean, m2))
+
+    moments = load_moments(conn)
+    control = moments.get(config.baseline)
+    if control is None:
+        return
+    # Holdout moments are kept but never tested: it is not a treatment arm
+    if kelompok == HOLDOUT_ARM:
+        return
+    arms = [kelompok] if kelompok != config.baseline else [k for k in moments if k not in (config.baseline, HOLDOUT_ARM)]
+    for arm in arms:
+        result = msprt(moments[arm], control, config.tau)
+        if result is None:
+            continue
+        # The always-valid p-value is the running minimum of 1 / likelihood ratio
+        conn.execute('''INSERT INTO sequential_monitor (arm, p_value, updated_at)
+                        VALUES (?, ?, CURRENT_TIMESTAMP)
+                        ON CONFLICT(arm) DO UPDATE SET p_value = MIN(p_value, excluded.p_value),
+                                                       updated_at = excluded.updated_at''',
+                     (arm, result['p_value']))
+
+
+def report(conn, config):
+    """Current sequential statistics and a stopping recommendation per arm"""
+    moments = load_moments(conn)
+    stored_p = dict(conn.execute('SELECT arm, p_value FROM sequential_monitor').fetchall())
+    control = moments.get(config.baseline, (0, 0.0, 0.0))
+    total = sum(m[0] for arm, m in moments.items() if arm != HOLDOUT_ARM)
+
+    arms = {}
+    for arm, stats in sorted(moments.items()):
+        if arm in (config.baseline, HOLDOUT_ARM):
+            continue
+        result = msprt(stats, control, config.tau)
+        entry = {
+            'n_treatment': stats[0],
+            'n_control': control[0],
+            'mean_treatment': stats[1],
+            'mean_control': control[1],
+            'difference': stats[1] - control[1],
+            'always_valid_p': None,
+            'confidence_sequence': None,
+        }
+        if result is not None:
+            p_value = min(stored_p.get(arm, 1.0), result['p_value'])
+            half = confidence_half_width(result['variance'], config.tau, config.alpha)
+            entry['always_valid_p'] = p_value
+            entry['confidence_sequence'] = [result['difference'] - half, result['difference'] + half]
+
+        if entry['always_valid_p'] is not None and entry['always_valid_p'] <= config.alpha:
+            entry['recommendation'] = 'stop_treatment_better' if entry['difference'] > 0 else 'stop_treatment_worse'
+        elif config.max_samples and total >= config.max_samples:
+            entry['recommendation'] = 'stop_max_samples_reached'
+        else:
+            entry['recommendation'] = 'continue'
+        arms[arm] = entry
+
+    return {
+        'baseline': config.baseline,
+        'alpha': config.alpha,
+        'tau': config.tau,
+        'total_observations': total,
+        'arms': arms,
+    }
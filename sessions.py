@@ -0,0 +1,286 @@
+"""Server-side sessions and the per-user funnel state cache.
+
+The session cookie only carries a random session id; the data lives in a
+store. Two stores share one small interface (get / set / delete of string
+values with a TTL):
+
+    MemoryStore   bounded LRU in this process
+    SQLiteStore   server_sessions table in the app database, shared by workers
+
+SESSION_BACKEND picks sqlite (default), memory or cookie (Flask's signed
+cookie session, unchanged). Each user's funnel state (profile / pretest /
+posttest progress) is carried in the session for the dashboard, checked
+against a per-user generation token kept in a store of its own (so tokens
+never evict live sessions); the routes that write those tables replace the
+token. A steady-state dashboard view therefore reads the session and the
+token: two small SQLite reads with the sqlite backend, one with cookie, none
+with memory. The memory backend keeps both in this process (bounded by
+SESSION_MAX_ENTRIES and FUNNEL_STATE_MAX_ENTRIES), so its sessions and
+invalidations do not reach other workers: it is only meant for
+single-process deployments.
+"""
+import logging
+import os
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+import db
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ('memory', 'sqlite', 'cookie')
+
+
+class MemoryStore:
+    """LRU of (expires_at, value), bounded to maxsize entries"""
+
+    def __init__(self, maxsize=10000):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.time():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'backend': 'memory',
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+
+class SQLiteStore:
+    """server_sessions rows, read and written on the request's pooled connection"""
+
+    def __init__(self, pool, purge_every=1000):
+        self.pool = pool
+        self.purge_every = purge_every
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        row = db.get_connection(self.pool).execute(
+            'SELECT value FROM server_sessions WHERE key = ? AND expires_at >= ?', (key, time.time())).fetchone()
+        with self._lock:
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return row[0]
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        with self._lock:
+            self._writes += 1
+            purge = self.purge_every and self._writes % self.purge_every == 0
+        statements = [('INSERT OR REPLACE INTO server_sessions (key, value, expires_at) VALUES (?, ?, ?)',
+                       (key, value, now + ttl))]
+        if purge:
+            statements.append(('DELETE FROM server_sessions WHERE expires_at < ?', (now,)))
+        db.execute_write(db.get_connection(self.pool), statements, self.pool.storage)
+
+    def delete(self, key):
+        db.execute_write(db.get_connection(self.pool),
+                         [('DELETE FROM server_sessions WHERE key = ?', (key,))], self.pool.storage)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'backend': 'sqlite',
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+
+class ServerSideSession(CallbackDict, SessionMixin):
+    def __init__(self, initial=None, sid=None):
+        def on_update(self):
+            self.modified = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.previous_sid = None
+        self.modified = False
+
+    def rotate(self):
+        """Move the data to a new session id on the next save (call on login)"""
+        if self.sid is not None and self.previous_sid is None:
+            self.previous_sid = self.sid
+        self.sid = None
+        self.modified = True
+
+
+class ServerSideSessionInterface(SessionInterface):
+    serializer = TaggedJSONSerializer()
+
+    def __init__(self, store, key_prefix='session:'):
+        self.store = store
+        self.key_prefix = key_prefix
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid:
+            data = self.store.get(self.key_prefix + sid)
+            if data is not None:
+                return ServerSideSession(self.serializer.loads(data), sid=sid)
+        # Unknown ids are never adopted, so a client cannot choose its own session id
+        return ServerSideSession()
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if session.previous_sid is not None:
+            self.store.delete(self.key_prefix + session.previous_sid)
+            session.previous_sid = None
+
+        if not session:
+            if session.modified:
+                if session.sid is not None:
+                    self.store.delete(self.key_prefix + session.sid)
+                response.delete_cookie(name, domain=domain, path=path,
+                                       secure=self.get_cookie_secure(app),
+                                       httponly=self.get_cookie_httponly(app))
+                response.vary.add('Cookie')
+            return
+
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        new_sid = session.sid is None
+        if new_sid:
+            session.sid = secrets.token_urlsafe(32)
+        if session.modified or new_sid:
+            self.store.set(self.key_prefix + session.sid, self.serializer.dumps(dict(session)),
+                           app.permanent_session_lifetime.total_seconds())
+        if new_sid or self.should_set_cookie(app, session):
+            response.set_cookie(name, session.sid,
+                                expires=self.get_expiration_time(app, session),
+                                httponly=self.get_cookie_httponly(app),
+                                domain=domain,
+                                path=path,
+                                secure=self.get_cookie_secure(app),
+                                samesite=self.get_cookie_samesite(app),
+                                partitioned=self.get_cookie_partitioned(app))
+            response.vary.add('Cookie')
+
+
+class FunnelStateCache:
+    """Dashboard flags per user, carried in the session and reloaded when the user's generation changes
+
+    The flags (profile_complete, pretest/posttest score) live in the session that is loaded anyway, tagged with
+    the user's generation token. Profile/pretest/posttest writes replace the
+    token through invalidate(), so every session of that user reloads them
+    once; a steady-state view only reads the token. A load that races an
+    invalidation is tagged with the old token and is reloaded on the next view.
+    """
+
+    def __init__(self, store, ttl=3600, key_prefix='funnel-gen:', session_key='funnel_generation'):
+        self.store = store
+        self.ttl = ttl
+        self.key_prefix = key_prefix
+        self.session_key = session_key
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.reloads = 0
+
+    def generation(self, user_id):
+        key = f'{self.key_prefix}{user_id}'
+        generation = self.store.get(key)
+        if generation is None:
+            # Never set, expired or evicted: a fresh token makes every session tagged before reload
+            generation = secrets.token_urlsafe(8)
+            self.store.set(key, generation, self.ttl)
+        return generation
+
+    def sync(self, session, loader):
+        """Bring the session's funnel flags up to date, calling loader(user_id) only when they are stale"""
+        user_id = session['user_id']
+        generation = self.generation(user_id)
+        if session.get(self.session_key) == generation:
+            with self._lock:
+                self.hits += 1
+            return
+        state = loader(user_id)
+        # The write routes set these flags themselves; a reload never clears one they set
+        if state['profile_complete'] and not session.get('profile_complete'):
+            session['profile_complete'] = True
+        for key in ('pretest_score', 'posttest_score'):
+            if state[key] is not None and session.get(key) != state[key]:
+                session[key] = state[key]
+        session[self.session_key] = generation
+        with self._lock:
+            self.reloads += 1
+
+    def invalidate(self, user_id):
+        self.store.set(f'{self.key_prefix}{user_id}', secrets.token_urlsafe(8), self.ttl)
+
+    def stats(self):
+        data = self.store.stats()
+        with self._lock:
+            data.update({'session_hits': self.hits, 'reloads': self.reloads})
+        return data
+
+
+def init_app(app, pool, environ=None):
+    """Install the SESSION_BACKEND session interface; returns (session store, funnel state store)"""
+    env = os.environ if environ is None else environ
+    backend = env.get('SESSION_BACKEND', 'sqlite')
+    if backend not in BACKENDS:
+        raise ValueError(f"SESSION_BACKEND must be one of {', '.join(BACKENDS)}, got {backend!r}")
+
+    if backend == 'memory':
+        store = MemoryStore(maxsize=int(env.get('SESSION_MAX_ENTRIES', 10000)))
+        funnel_store = MemoryStore(maxsize=int(env.get('FUNNEL_STATE_MAX_ENTRIES', 10000)))
+    else:
+        # The cookie backend still needs funnel invalidations to reach every worker
+        store = SQLiteStore(pool) if backend == 'sqlite' else None
+        funnel_store = SQLiteStore(pool)
+    if store is not None:
+        app.session_interface = ServerSideSessionInterface(store)
+    app.extensions['session_store'] = store
+    app.extensions['funnel_state_store'] = funnel_store
+    logger.info("Session backend: %s", backend)
+    return store, funnel_store
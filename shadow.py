@@ -0,0 +1,116 @@
+"""Shadow scoring of a candidate model against live /education traffic.
+
+The request thread only hands the user_data it already built (plus the
+primary model's answer) to a bounded thread pool and returns. When every
+slot is taken the work is dropped, not queued, so a slow candidate can
+never add latency or unbounded memory. Agreement with the primary model
+is accumulated and logged every `log_every` scored requests.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class ShadowStats:
+    def __init__(self, version):
+        self.version = version
+        self.started_at = time.time()
+        self.submitted = 0
+        self.dropped = 0
+        self.scored = 0
+        self.errors = 0
+        self.agreed = 0
+        self.confidence_delta_total = 0.0
+        self.latency_total = 0.0
+        # (primary label, candidate label) -> count
+        self.transitions = {}
+
+    def to_dict(self):
+        return {
+            'model_version': self.version,
+            'submitted': self.submitted,
+            'dropped': self.dropped,
+            'scored': self.scored,
+            'errors': self.errors,
+            'agreement_rate': self.agreed / self.scored if self.scored else None,
+            'confidence_delta_avg': self.confidence_delta_total / self.scored if self.scored else None,
+            'latency_avg_ms': self.latency_total / self.scored * 1000 if self.scored else None,
+            'transitions': {f'{primary}->{candidate}': count
+                            for (primary, candidate), count in sorted(self.transitions.items())},
+        }
+
+
+class ShadowScorer:
+    def __init__(self, max_workers=2, max_pending=32, log_every=100):
+        self.log_every = log_every
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='shadow')
+        # Running + waiting tasks; beyond this new work is dropped
+        self._slots = threading.BoundedSemaphore(max_workers + max_pending)
+        self._lock = threading.Lock()
+        self._candidate = None
+        self._stats = None
+
+    @property
+    def candidate(self):
+        return self._candidate
+
+    def set_candidate(self, model):
+        """Start shadowing model (replacing any previous candidate and its stats)"""
+        with self._lock:
+            self._candidate = model
+            self._stats = ShadowStats(getattr(model, 'model_version', None))
+
+    def clear(self):
+        with self._lock:
+            self._candidate = None
+
+    def submit(self, user_data, primary_label, primary_confidence):
+        """Queue one shadow prediction; returns False if there is no candidate or no free slot"""
+        with self._lock:
+            candidate, stats = self._candidate, self._stats
+            if candidate is None:
+                return False
+            stats.submitted += 1
+            if not self._slots.acquire(blocking=False):
+                stats.dropped += 1
+                return False
+        try:
+            self._executor.submit(self._score, candidate, stats, dict(user_data), primary_label, primary_confidence)
+        except RuntimeError:
+            # Executor shut down
+            self._slots.release()
+            return False
+        return True
+
+    def _score(self, candidate, stats, user_data, primary_label, primary_confidence):
+        try:
+            start = time.perf_counter()
+            label, confidence = candidate.predict_with_confidence(user_data)
+            latency = time.perf_counter() - start
+            with self._lock:
+                stats.scored += 1
+                stats.latency_total += latency
+                stats.agreed += label == primary_label
+                stats.confidence_delta_total += (confidence or 0.0) - (primary_confidence or 0.0)
+                key = (str(primary_label), str(label))
+                stats.transitions[key] = stats.transitions.get(key, 0) + 1
+                scored, agreed = stats.scored, stats.agreed
+            if self.log_every and scored % self.log_every == 0:
+                logger.info("Shadow model %s: %d/%d agree with primary", stats.version, agreed, scored,
+                            extra={'data': {'agreement_rate': agreed / scored}})
+        except Exception:
+            with self._lock:
+                stats.errors += 1
+            logger.exception("Shadow prediction error")
+        finally:
+            self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'active': self._candidate is not None,
+                'candidate': self._stats.to_dict() if self._stats is not None else None,
+            }
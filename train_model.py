@@ -1,6 +1,9 @@
+import log_config
 from model import recommendation_model
 
 if __name__ == '__main__':
+    log_config.configure()
     print("Training recommendation model...")
-    recommendation_model.train_model()
-    print("Model training completed!")
\ No newline at end of file
+    # Feature store rows (synced incrementally); falls back to sample data when empty
+    recommendation_model.train_model(recommendation_model.get_user_data_from_db())
+    print("Model training completed!")
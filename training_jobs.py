@@ -0,0 +1,174 @@
+"""Background training of recommendation models, tracked as jobs.
+
+/admin/train_model submits a job and returns at once. A job moves
+queued -> running and then ends in one of:
+
+    succeeded   validated and adopted by the serving model (and saved as CURRENT)
+    rejected    failed validation (accuracy below MODEL_MIN_ACCURACY or smoke prediction)
+    failed      raised while loading data or training
+    shadowing   shadow run: validated and handed to the shadow scorer, waiting
+                for promote() (-> succeeded) or a newer shadow run (-> superseded)
+
+Training data comes from the feature store, incrementally synced from the app
+database; below MODEL_MIN_TRAINING_ROWS labelled rows the candidate trains on
+generated sample data instead. job.data_source records which was used.
+"""
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+# Jobs that are never pruned from the registry
+IN_FLIGHT = ('queued', 'running', 'shadowing')
+
+
+class TrainingJob:
+    """Status record for one background training run"""
+
+    def __init__(self, job_id):
+        self.id = job_id
+        self.status = 'queued'
+        self.created_at = datetime.utcnow()
+        self.started_at = None
+        self.finished_at = None
+        self.accuracy = None
+        self.model_version = None
+        self.error = None
+        self.shadow = False
+        # 'feature_store' or 'sample' (too little real data yet)
+        self.data_source = None
+        self.training_rows = None
+        # Validated but not yet promoted model of a shadow run
+        self.candidate = None
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'status': self.status,
+            'created_at': self.created_at.isoformat(),
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'accuracy': self.accuracy,
+            'model_version': self.model_version,
+            'error': self.error,
+            'shadow': self.shadow,
+            'data_source': self.data_source,
+            'training_rows': self.training_rows,
+        }
+
+
+class TrainingJobRunner:
+    """Trains candidate models off the request thread and swaps them in once validated.
+
+    The serving model is never touched while a fit runs: a fresh candidate is
+    trained without saving, checked against min_accuracy and a smoke prediction,
+    and only then adopted (and persisted) by the serving model. A shadow run
+    instead hands the candidate to the shadow scorer and waits for promote().
+    """
+
+    def __init__(self, serving_model, model_factory, min_accuracy=0.5, max_workers=1, max_jobs=100,
+                 shadow_scorer=None, min_rows=50):
+        self.serving_model = serving_model
+        # Below this many feature-store rows the candidate trains on generated sample data
+        self.min_rows = min_rows
+        self.shadow_scorer = shadow_scorer
+        self.model_factory = model_factory
+        self.min_accuracy = min_accuracy
+        self.max_jobs = max_jobs
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='training')
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, df=None, shadow=False):
+        """Queue a training run and return its job immediately"""
+        if shadow and self.shadow_scorer is None:
+            raise ValueError("No shadow scorer configured")
+        job = TrainingJob(uuid.uuid4().hex[:12])
+        job.shadow = shadow
+        with self._lock:
+            self._jobs[job.id] = job
+            # Forget the oldest finished jobs so the registry stays bounded; in-flight ones are kept
+            excess = len(self._jobs) - self.max_jobs
+            if excess > 0:
+                finished = [job_id for job_id, other in self._jobs.items() if other.status not in IN_FLIGHT]
+                for job_id in finished[:excess]:
+                    del self._jobs[job_id]
+        self._executor.submit(self._run, job, df)
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list(self):
+        with self._lock:
+            return list(self._jobs.values())
+
+    def validate(self, candidate, df=None):
+        """Return an error message if the candidate must not be promoted"""
+        if candidate.predictor is None:
+            return 'training failed'
+        if candidate.last_accuracy is None or candidate.last_accuracy < self.min_accuracy:
+            return f'accuracy {candidate.last_accuracy} below minimum {self.min_accuracy}'
+        sample = candidate.generate_sample_data(5) if df is None else df.head(5)
+        labels, confidences = candidate.predict_batch(sample.drop(columns='level_rekomendasi').to_dict('records'))
+        if len(labels) != len(sample) or not all(0.0 <= c <= 1.0 for c in confidences):
+            return 'smoke prediction failed'
+        return None
+
+    def _run(self, job, df):
+        job.status = 'running'
+        job.started_at = datetime.utcnow()
+        try:
+            candidate = self.model_factory()
+            if df is None:
+                # Incremental: only users changed since the last sync are read from the app database
+                df = candidate.get_user_data_from_db()
+                if df is not None and len(df) < self.min_rows:
+                    df = None
+                job.data_source = 'feature_store' if df is not None else 'sample'
+            candidate.train_model(df, save=False)
+            job.training_rows = len(df) if df is not None else None
+            job.accuracy = candidate.last_accuracy
+
+            error = self.validate(candidate, df)
+            if error:
+                job.status = 'rejected'
+                job.error = error
+                return
+
+            job.model_version = candidate.model_version
+            if job.shadow:
+                with self._lock:
+                    # The scorer holds one candidate: the job it replaces can no longer be promoted
+                    for other in self._jobs.values():
+                        if other.status == 'shadowing':
+                            other.status = 'superseded'
+                            other.candidate = None
+                    job.candidate = candidate
+                    self.shadow_scorer.set_candidate(candidate)
+                    job.status = 'shadowing'
+                return
+
+            self.serving_model.adopt(candidate)
+            self.serving_model.save_model()
+            job.status = 'succeeded'
+        except Exception as e:
+            job.status = 'failed'
+            job.error = str(e)
+        finally:
+            job.finished_at = datetime.utcnow()
+
+    def promote(self, job_id):
+        """Adopt the candidate of a shadowing job; returns an error message or None"""
+        job = self.get(job_id)
+        if job is None or job.status != 'shadowing':
+            return 'no shadowing job with that id'
+        if self.shadow_scorer.candidate is not job.candidate:
+            return 'job is no longer the shadow candidate'
+        self.shadow_scorer.clear()
+        self.serving_model.adopt(job.candidate)
+        self.serving_model.save_model()
+        job.candidate = None
+        job.status = 'succeeded'
+        return None